@@ -1,73 +1,957 @@
 # 🚀 Servidor MCP Remoto Corregido para Claude Desktop
+import time
+IMPORT_STARTED_AT = time.time()
 import os
 import json
-import time
+import importlib
 import sys
-from datetime import datetime
-from flask import Flask, jsonify, request, make_response
+import uuid
+import base64
+import heapq
+import functools
+import math
+import gc
+import fcntl
+import pickle
+import hashlib
+import zlib
+import io
+import csv
+import array
+import struct
+import re
+import unicodedata
+import queue
+import collections
+import threading
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from flask import Flask, jsonify, request, make_response, Response, stream_with_context, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import requests
+from werkzeug.middleware.proxy_fix import ProxyFix
+from urllib.parse import urlencode
+
+class LazyModule:
+    """Módulo que se importa recién en su primer uso (arranque rápido);
+    si es opcional, el proxy es falso cuando el módulo no está instalado"""
+    def __init__(self, name, optional=False):
+        self._name = name
+        self._optional = optional
+        self._module = None
+    
+    def _load(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError:
+                if not self._optional:
+                    raise
+                self._module = False
+        return self._module
+    
+    def __bool__(self):
+        return bool(self._load())
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+# Cliente HTTP: solo hace falta al consultar Redash, no para responder /health
+requests = LazyModule('requests')
+# Compresión: se importa con la primera respuesta comprimida (csv, pickle, heapq y
+# unicodedata no se difieren porque Flask/werkzeug ya los importan)
+brotli = LazyModule('brotli', optional=True)
+gzip = LazyModule('gzip')
+
+def json_default(value):
+    """Serializar tipos nativos (fechas, decimales) a JSON"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+class OrdersJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON que mantiene fechas en ISO 8601 y decimales como números"""
+    @staticmethod
+    def default(o):
+        return json_default(o)
 
 app = Flask(__name__)
+app.json = OrdersJSONProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'simple-secret-key')
 
+# Detrás de un proxy (Render agrega uno): tomar la IP real del cliente de
+# X-Forwarded-For solo para los saltos de proxy de confianza
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS,
+                            x_host=TRUSTED_PROXY_HOPS)
+
 # CORS más permisivo
 CORS(app, 
      origins=["*"],
-     methods=["GET", "POST", "OPTIONS"],
+     methods=["GET", "POST", "DELETE", "OPTIONS"],
      allow_headers=["*"],
+     expose_headers=["Mcp-Session-Id"],
      supports_credentials=True)
 
-# Cache en memoria
-data_cache = None
-cache_time = None
+# Cache en memoria: un snapshot inmutable (resultado + índices derivados) que se
+# publica cambiando la referencia; cada petición usa el mismo de principio a fin
+Snapshot = collections.namedtuple('Snapshot', [
+    'result', 'retrieved_at', 'order_index', 'order_keys', 'fuzzy_indexes',
+    'text_index', 'digests', 'timeseries', 'history'
+])
+EMPTY_SNAPSHOT = Snapshot(None, None, {}, [], {}, {}, {}, {}, ())
+current_snapshot = EMPTY_SNAPSHOT
+snapshot_refresh_lock = threading.Lock()
+background_refresh_lock = threading.Lock()
+last_background_refresh = 0.0
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', 300))
+REFRESH_RETRY_SECONDS = float(os.environ.get('REFRESH_RETRY_SECONDS', 5))
+
+# Campos que identifican una orden (clave primaria lógica)
+ORDER_KEY_FIELDS = ['order_number', 'order_id', 'number', 'id', 'order', 'orderid']
+
+# Campos posibles para email del cliente
+EMAIL_FIELDS = ['email', 'customer_email', 'user_email', 'client_email', 'mail', 'customer_mail']
+
+# Campos comunes de orden y sus posibles nombres de columna
+SUMMARY_FIELDS = {
+    'order_number': ['order_number', 'order_id', 'number', 'id'],
+    'email': ['email', 'customer_email', 'user_email', 'client_email'],
+    'customer': ['customer', 'customer_name', 'client', 'client_name', 'name'],
+    'status': ['status', 'order_status', 'state'],
+    'total': ['total', 'amount', 'total_amount', 'price'],
+    'date': ['date', 'created_at', 'order_date', 'created']
+}
+
+# Tipos de columna de Redash → tipo nativo usado en memoria
+REDASH_TYPE_MAP = {
+    'integer': 'integer',
+    'int': 'integer',
+    'float': 'float',
+    'decimal': 'decimal',
+    'number': 'float',
+    'boolean': 'boolean',
+    'bool': 'boolean',
+    'datetime': 'datetime',
+    'timestamp': 'datetime',
+    'date': 'date',
+    'string': 'string',
+    'text': 'string'
+}
+
+# Columnas monetarias: se guardan como Decimal para sumar sin errores de redondeo
+DECIMAL_COLUMNS = {'total', 'amount', 'total_amount', 'price', 'subtotal', 'discount', 'shipping', 'tax'}
 
-def clean_value(value):
-    """Limpiar y convertir valores para evitar errores de validación"""
+# Columnas categóricas: pocos valores distintos, se internan para compartir memoria
+CATEGORICAL_COLUMNS = {'status', 'order_status', 'state'}
+
+def normalize_column_name(name, index=0):
+    """Normalizar nombre de columna (minúsculas, sin espacios ni guiones)"""
+    name = str(name).strip().replace(' ', '_').replace('-', '_').lower() if name is not None else ''
+    if not name or name == '_':
+        name = f'column_{index}'
+    return name
+
+def infer_value_type(value):
+    """Inferir el tipo lógico de un valor crudo cuando Redash no lo informa"""
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    return 'string'
+
+def infer_schema(columns, rows):
+    """Construir el esquema {columna: tipo} a partir de los metadatos de Redash"""
+    schema = {}
+    for i, col in enumerate(columns):
+        if isinstance(col, dict):
+            name = normalize_column_name(col.get('name', f'column_{i}'), i)
+            redash_type = str(col.get('type') or '').lower()
+        else:
+            name = normalize_column_name(col, i)
+            redash_type = ''
+        schema[name] = REDASH_TYPE_MAP.get(redash_type)
+    
+    # Completar columnas sin tipo con el primer valor no nulo
+    sample_rows = rows[:50]
+    for row in sample_rows:
+        if isinstance(row, dict):
+            items = ((normalize_column_name(k), v) for k, v in row.items())
+        elif isinstance(row, (list, tuple)):
+            items = zip(schema.keys(), row)
+        else:
+            continue
+        for name, value in items:
+            if schema.get(name) is None and value is not None and value != '':
+                schema[name] = infer_value_type(value)
+    
+    for name, col_type in schema.items():
+        if col_type is None:
+            col_type = 'string'
+        if name in DECIMAL_COLUMNS and col_type in ('integer', 'float', 'string'):
+            col_type = 'decimal'
+        elif name in CATEGORICAL_COLUMNS and col_type == 'string':
+            col_type = 'category'
+        schema[name] = col_type
+    return schema
+
+def resolve_field_map(columns):
+    """Resolver una sola vez (por esquema) qué columnas concretas cubren cada campo lógico"""
+    available = set(columns)
+    fields = {}
+    for field_type, possible_names in SUMMARY_FIELDS.items():
+        for name in possible_names:
+            if name in available:
+                fields[field_type] = name
+                break
+    return {
+        "fields": fields,
+        "key_columns": [name for name in ORDER_KEY_FIELDS if name in available],
+        "email_columns": [name for name in EMAIL_FIELDS if name in available]
+    }
+
+def get_field_map(data):
+    """Mapa de campos del snapshot (calculado en el refresh)"""
+    metadata = data.get("metadata", {})
+    return metadata.get("field_map") or resolve_field_map(metadata.get("columns", []))
+
+def parse_datetime(value):
+    """Convertir texto ISO 8601 (formato de Redash) a datetime"""
+    text = value.strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.fromisoformat(text)
+
+def clean_value(value, col_type=None):
+    """Limpiar y convertir valores al tipo nativo de la columna"""
     if value is None:
-        return ""
-    if isinstance(value, (int, float)) and (value != value):  # NaN check
-        return 0
+        return None
+    if isinstance(value, float) and (value != value):  # NaN check
+        return None
     if isinstance(value, str):
-        return value.strip()
+        value = value.strip()
+        if value == '' and col_type not in (None, 'string', 'category'):
+            return None
+    
+    try:
+        if col_type == 'integer':
+            return int(value)
+        if col_type == 'float':
+            return float(value)
+        if col_type == 'decimal':
+            return Decimal(str(value))
+        if col_type == 'boolean':
+            if isinstance(value, str):
+                return value.lower() in ('true', 't', '1', 'yes', 'si', 'sí')
+            return bool(value)
+        if col_type == 'datetime':
+            return parse_datetime(value) if isinstance(value, str) else value
+        if col_type == 'date':
+            return parse_datetime(value).date() if isinstance(value, str) else value
+        if col_type == 'category':
+            return sys.intern(value if isinstance(value, str) else str(value))
+    except (ValueError, TypeError, InvalidOperation):
+        # Valor que no respeta el tipo declarado: se conserva como texto
+        return value if isinstance(value, str) else str(value)
+    
+    if isinstance(value, (str, int, float, bool)):
+        return value
     return str(value)
 
+# Llamadas en curso compartidas entre peticiones idénticas concurrentes
+inflight_calls = {}
+inflight_lock = threading.Lock()
+coalesce_stats = {"executed": 0, "coalesced": 0}
+
+def coalesce(key, compute):
+    """Ejecutar compute() una sola vez para llamadas concurrentes con la misma clave"""
+    with inflight_lock:
+        call = inflight_calls.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = inflight_calls[key] = {"event": threading.Event(), "result": None, "error": None}
+            coalesce_stats["executed"] += 1
+        else:
+            coalesce_stats["coalesced"] += 1
+    
+    if not is_leader:
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+    
+    try:
+        call["result"] = compute()
+        return call["result"]
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with inflight_lock:
+            inflight_calls.pop(key, None)
+        call["event"].set()
+
+def get_snapshot():
+    """Snapshot de la petición en curso (fijado en su primer uso) o, fuera de una petición, el publicado"""
+    if not has_request_context():
+        return current_snapshot
+    if 'snapshot' not in g:
+        g.snapshot = current_snapshot
+    return g.snapshot
+
+def snapshot_is_fresh(snapshot):
+    """True si el snapshot tiene menos de CACHE_TTL_SECONDS"""
+    return snapshot.retrieved_at is not None and (time.time() - snapshot.retrieved_at) < CACHE_TTL_SECONDS
+
 def get_redash_data():
     """Obtener datos de Redash con cache y limpieza de datos"""
-    global data_cache, cache_time
+    snapshot = get_snapshot()
+    if snapshot.result is not None:
+        # Cache por CACHE_TTL_SECONDS (5 minutos por defecto); vencido, se sigue
+        # sirviendo mientras otro hilo trae el siguiente
+        if snapshot_is_fresh(snapshot):
+            print("📦 Using cached data")
+        else:
+            print("📦 Using cached data (refresh in background)")
+            refresh_snapshot_in_background()
+        return snapshot.result
+    
+    # Sin snapshot todavía: las peticiones concurrentes comparten la primera carga
+    result = coalesce("snapshot:refresh", refresh_snapshot)
+    if has_request_context():
+        g.snapshot = current_snapshot
+    return result
+
+def load_fresh_snapshot():
+    """Traer un snapshot nuevo: el del worker refresher (modo preload) o de Redash"""
+    # En modo preload solo el worker designado consulta Redash; el resto
+    # toma el snapshot que este publica
+    if preload_mode and not is_snapshot_refresher():
+        shared = wait_for_shared_snapshot()
+        if shared:
+            return shared
+        if current_snapshot.result is None and not is_snapshot_refresher():
+            # Sin datos propios (FAST_START): no se descarga por cuenta propia
+            return {"success": False, "error": "Waiting for the refresher worker to publish the first snapshot", "data": []}
+    return fetch_redash_data()
+
+def refresh_snapshot(loader=load_fresh_snapshot):
+    """Ejecutar un refresco; en cada proceso los refrescos se hacen de a uno"""
+    seen = current_snapshot
+    with snapshot_refresh_lock:
+        if current_snapshot is not seen and snapshot_is_fresh(current_snapshot):
+            # Otro refresco publicó un snapshot mientras se esperaba el lock
+            return current_snapshot.result
+        return loader()
+
+def refresh_snapshot_in_background():
+    """Refrescar en otro hilo sin bloquear al lector (uno a la vez, con pausa entre intentos)"""
+    global last_background_refresh
+    with background_refresh_lock:
+        now = time.time()
+        if snapshot_refresh_lock.locked() or now - last_background_refresh < REFRESH_RETRY_SECONDS:
+            return
+        last_background_refresh = now
+    
+    def run():
+        try:
+            coalesce("snapshot:refresh", refresh_snapshot)
+        except Exception as e:
+            print(f"❌ Background snapshot refresh failed: {str(e)}")
+    threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
+
+def install_snapshot(result, retrieved_time=None):
+    """Construir los índices de un resultado procesado y publicarlo como snapshot
+    (se llama con snapshot_refresh_lock tomado, ver refresh_snapshot)"""
+    global current_snapshot
+    previous = current_snapshot
+    processed_data = result["data"]
+    metadata = result["metadata"]
+    field_map = metadata["field_map"]
+    retrieved_time = retrieved_time or time.time()
+    started = time.time()
+    index, keys = build_order_index(processed_data, field_map["key_columns"])
+    fuzzy = build_fuzzy_indexes(processed_data, field_map)
+    text = build_text_index(processed_data, metadata["schema"], field_map)
+    refresh_stats["index_seconds"] = round(time.time() - started, 3)
+    
+    # Cambios respecto del snapshot anterior, por hash de filas (None en la primera carga)
+    digests = compute_digests(processed_data, field_map["key_columns"])
+    changes = diff_digests(previous.digests, digests) if previous.digests else None
+    
+    # Los lectores pasan al snapshot nuevo, ya completo, con un solo cambio de referencia
+    current_snapshot = Snapshot(
+        result=result,
+        retrieved_at=retrieved_time,
+        order_index=index,
+        order_keys=keys,
+        fuzzy_indexes=fuzzy,
+        text_index=text,
+        digests=digests,
+        timeseries=update_timeseries(processed_data, field_map, changes, previous.timeseries),
+        history=record_snapshot_version(previous.history, metadata.get("version"), retrieved_time, changes)
+    )
+    publish_data_changes(processed_data, field_map["key_columns"], changes)
+
+# ============================================================
+# Arranque rápido: /health responde de inmediato y el snapshot se
+# carga en segundo plano; /ready indica cuándo está listo
+# ============================================================
+
+FAST_START = os.environ.get('FAST_START', 'false').lower() in ('1', 'true', 'yes')
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', 10))
+
+startup_stats = {
+    "import_started_at": IMPORT_STARTED_AT,
+    "import_seconds": None,
+    "warmup_seconds": None,
+    "time_to_ready_seconds": None,
+    "warmup_attempts": 0
+}
+warmup_lock = threading.Lock()
+warmup_pid = None
+
+def start_warmup():
+    """Arrancar (una vez por proceso) la carga del snapshot en segundo plano"""
+    global warmup_pid
+    with warmup_lock:
+        if warmup_pid == os.getpid():
+            return
+        warmup_pid = os.getpid()
+    threading.Thread(target=warm_snapshot, name="snapshot-warmup", daemon=True).start()
+
+def warm_snapshot():
+    """Cargar el snapshot hasta lograrlo, registrando los tiempos de arranque"""
+    started = time.time()
+    while True:
+        startup_stats["warmup_attempts"] += 1
+        try:
+            data = get_redash_data()
+            if data.get("success"):
+                break
+            print(f"⚠️ Warm-up attempt failed: {data.get('error')}")
+        except Exception as e:
+            print(f"⚠️ Warm-up attempt failed: {str(e)}")
+        time.sleep(WARMUP_RETRY_SECONDS)
     
-    # Cache por 5 minutos
-    if data_cache and cache_time and (time.time() - cache_time) < 300:
-        print("📦 Using cached data")
-        return data_cache
+    ready_at = time.time()
+    startup_stats["warmup_seconds"] = round(ready_at - started, 3)
+    startup_stats["time_to_ready_seconds"] = round(ready_at - IMPORT_STARTED_AT, 3)
+    print(f"🔥 Snapshot warm: {len(data.get('data', []))} records, "
+          f"ready {startup_stats['time_to_ready_seconds']}s after start")
+
+def is_ready():
+    """True si hay un snapshot válido en memoria"""
+    return current_snapshot.result is not None
+
+# ============================================================
+# Modo preload de gunicorn (ver gunicorn_preload.conf.py)
+# ============================================================
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/tmp/redash-mcp-snapshot')
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, 'snapshot.pickle')
+REFRESHER_LOCK_FILE = os.path.join(SNAPSHOT_DIR, 'refresher.lock')
+
+# Espera de los workers sin datos al primer snapshot del refresher (FAST_START)
+SHARED_SNAPSHOT_WAIT_SECONDS = float(os.environ.get('SHARED_SNAPSHOT_WAIT_SECONDS', 30))
+SHARED_SNAPSHOT_POLL_SECONDS = float(os.environ.get('SHARED_SNAPSHOT_POLL_SECONDS', 0.5))
+
+preload_mode = False
+refresher_lock_handle = None
+
+def preload_snapshot():
+    """Cargar snapshot e índices en el proceso maestro antes del fork (evita N descargas al arrancar)"""
+    global preload_mode, current_snapshot
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
     
+    # Sin GC durante la carga y con gc.freeze() el recolector de los workers no
+    # escribe en las páginas de este snapshot inicial mientras lo usen. No es un
+    # modo de memoria compartida: los refcounts copian las páginas que se recorren
+    # y desde el primer refresh cada worker tiene su propia copia (~N+1 datasets).
+    # El maestro descarga directamente: el lock de refresco es solo para workers
+    if FAST_START:
+        # Arranque rápido: los workers cargan el snapshot en segundo plano
+        gc.freeze()
+        preload_mode = True
+        print(f"⚡ Fast start: preloaded modules only, frozen_objects={gc.get_freeze_count()}")
+        return
+    
+    gc.disable()
+    started = time.time()
+    data = get_redash_data()
+    # Los procesos del pool no deben quedar como hijos del maestro de gunicorn
+    shutdown_refresh_pool()
+    gc.freeze()
+    gc.enable()
+    preload_mode = True
+    print(f"🧊 Preloaded snapshot before fork: success={data.get('success')}, "
+          f"records={len(data.get('data', []))}, frozen_objects={gc.get_freeze_count()}, "
+          f"took={time.time() - started:.2f}s")
+    if data.get("success"):
+        published_at = write_shared_snapshot(data)
+        if published_at:
+            # Misma edad que el archivo publicado para que los workers no lo recarguen
+            current_snapshot = current_snapshot._replace(retrieved_at=published_at)
+
+def init_worker():
+    """Inicializar un worker recién creado con fork"""
+    global refresher_lock_handle
+    refresher_lock_handle = None
+    gc.enable()
+    role = "refresher" if is_snapshot_refresher() else "follower"
+    print(f"👷 Worker {os.getpid()} started as snapshot {role}")
+    threading.Thread(target=snapshot_refresh_loop, name="snapshot-refresher", daemon=True).start()
+    ensure_query_refresher_running()
+    if FAST_START:
+        start_warmup()
+
+def snapshot_refresh_loop():
+    """Refrescar en segundo plano si este worker es el refresher (o puede serlo)"""
+    while True:
+        time.sleep(CACHE_TTL_SECONDS)
+        try:
+            if is_snapshot_refresher() and not snapshot_is_fresh(current_snapshot):
+                coalesce("snapshot:refresh", refresh_snapshot)
+        except Exception as e:
+            print(f"❌ Background snapshot refresh failed: {str(e)}")
+
+def is_snapshot_refresher():
+    """True si este worker tiene (o puede tomar) el lock de refresco"""
+    global refresher_lock_handle
+    if refresher_lock_handle is not None:
+        return True
+    handle = open(REFRESHER_LOCK_FILE, 'a+')
     try:
-        print("🔄 Fetching fresh data from Redash...")
-        url = "https://redash-devops.farmuhub.co/api/queries/3654/results.json?api_key=KoRPiEdAKlWuqPk7UVwtFWmjeIEkjlQPZ2kzsG3H"
-        
-        headers = {
-            'User-Agent': 'MCP-Server/1.0',
-            'Accept': 'application/json'
-        }
-        
-        response = requests.get(url, timeout=30, headers=headers)
-        print(f"📡 Redash response status: {response.status_code}")
-        print(f"📡 Response headers: {dict(response.headers)}")
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    # El lock se libera solo si el proceso muere; otro worker lo tomará entonces
+    refresher_lock_handle = handle
+    print(f"🔑 Worker {os.getpid()} is now the snapshot refresher")
+    return True
+
+def write_shared_snapshot(result):
+    """Publicar el snapshot para los demás workers (escritura atómica); devuelve su mtime"""
+    try:
+        temp_path = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, SNAPSHOT_FILE)
+        return os.stat(SNAPSHOT_FILE).st_mtime
+    except OSError as e:
+        print(f"⚠️ Could not write shared snapshot: {str(e)}")
+        return None
+
+def wait_for_shared_snapshot():
+    """Snapshot publicado por el refresher; sin datos propios, esperarlo hasta
+    SHARED_SNAPSHOT_WAIT_SECONDS (o hasta que este worker pase a ser el refresher)"""
+    deadline = time.time() + SHARED_SNAPSHOT_WAIT_SECONDS
+    while True:
+        shared = load_shared_snapshot()
+        if shared or current_snapshot.result is not None:
+            return shared
+        if time.time() >= deadline or is_snapshot_refresher():
+            return None
+        time.sleep(SHARED_SNAPSHOT_POLL_SECONDS)
+
+def load_shared_snapshot():
+    """Tomar el snapshot publicado por el worker refresher si es más nuevo que el local
+    (pickle.load crea una copia privada: coordina la descarga, no comparte memoria)"""
+    try:
+        published_at = os.stat(SNAPSHOT_FILE).st_mtime
+    except OSError:
+        return None
+    
+    if time.time() - published_at > 2 * CACHE_TTL_SECONDS:
+        # El refresher no está actualizando (o el archivo es de una ejecución
+        # anterior): con datos propios este worker consultará Redash
+        return None
+    snapshot = current_snapshot
+    if snapshot.retrieved_at and published_at <= snapshot.retrieved_at:
+        return snapshot.result
+    
+    try:
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            result = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f"⚠️ Could not read shared snapshot: {str(e)}")
+        return None
+    
+    print(f"📥 Loaded shared snapshot published at {datetime.fromtimestamp(published_at).isoformat()}")
+    install_snapshot(result, published_at)
+    return result
+
+# ============================================================
+# Refresh paralelo: descarga por páginas y procesamiento en varios procesos
+# ============================================================
+
+REDASH_BASE_URL = os.environ.get('REDASH_BASE_URL', 'https://redash-devops.farmuhub.co')
+REDASH_QUERY_ID = os.environ.get('REDASH_QUERY_ID', '3654')
+REDASH_API_KEY = os.environ.get('REDASH_API_KEY', 'KoRPiEdAKlWuqPk7UVwtFWmjeIEkjlQPZ2kzsG3H')
+REDASH_HEADERS = {
+    'User-Agent': 'MCP-Server/1.0',
+    'Accept': 'application/json'
+}
+
+# Con más de una página la query se ejecuta una vez por página, en paralelo,
+# con los parámetros {page, page_count}; la query debe filtrar por ellos
+# (p. ej. WHERE MOD(id, {{page_count}}) = {{page}})
+REDASH_FETCH_PAGES = int(os.environ.get('REDASH_FETCH_PAGES', 1))
+REDASH_PAGE_PARAM = os.environ.get('REDASH_PAGE_PARAM', 'page')
+REDASH_PAGE_COUNT_PARAM = os.environ.get('REDASH_PAGE_COUNT_PARAM', 'page_count')
+REDASH_JOB_POLL_SECONDS = float(os.environ.get('REDASH_JOB_POLL_SECONDS', 1))
+REDASH_JOB_TIMEOUT_SECONDS = float(os.environ.get('REDASH_JOB_TIMEOUT_SECONDS', 120))
+
+# Limpieza e índices se reparten en procesos solo con suficientes filas y CPUs
+REFRESH_WORKERS = int(os.environ.get('REFRESH_WORKERS', os.cpu_count() or 1))
+PARALLEL_MIN_ROWS = int(os.environ.get('PARALLEL_MIN_ROWS', 20000))
+
+refresh_pool = None
+refresh_pool_pid = None
+refresh_pool_lock = threading.Lock()
+refresh_stats = {}
+
+def redash_url(path):
+    """URL autenticada de la API de Redash"""
+    return f"{REDASH_BASE_URL}{path}?api_key={REDASH_API_KEY}"
+
+def submit_redash_query(parameters=None, max_age=0):
+    """Pedir una ejecución de la query: {"job": ...} o {"query_result": ...} si Redash la tiene en cache"""
+    payload = {"max_age": max_age}
+    if parameters:
+        payload["parameters"] = parameters
+    response = requests.post(redash_url(f"/api/queries/{REDASH_QUERY_ID}/results"),
+                             json=payload, timeout=30, headers=REDASH_HEADERS)
+    response.raise_for_status()
+    return response.json()
+
+def poll_redash_job(job, timeout=REDASH_JOB_TIMEOUT_SECONDS, on_update=None):
+    """Consultar un job de Redash hasta que termine; devuelve el job final"""
+    deadline = time.time() + timeout
+    # Estados de job en Redash: 1 en cola, 2 ejecutando, 3 ok, 4 error, 5 cancelado
+    while job.get("status") not in (3, 4, 5):
+        if time.time() > deadline:
+            raise TimeoutError(f"Redash job {job.get('id')} did not finish in {timeout:.0f}s")
+        time.sleep(REDASH_JOB_POLL_SECONDS)
+        response = requests.get(redash_url(f"/api/jobs/{job['id']}"), timeout=30, headers=REDASH_HEADERS)
+        response.raise_for_status()
+        job = response.json().get("job", {})
+        if on_update:
+            on_update(job)
+    
+    if job.get("status") != 3:
+        raise RuntimeError(f"Redash job {job.get('id')} failed: {job.get('error')}")
+    return job
+
+def wait_for_redash_job(job, timeout=REDASH_JOB_TIMEOUT_SECONDS):
+    """Esperar un job de ejecución de Redash y devolver su query_result"""
+    job = poll_redash_job(job, timeout)
+    response = requests.get(redash_url(f"/api/query_results/{job['query_result_id']}"),
+                            timeout=30, headers=REDASH_HEADERS)
+    response.raise_for_status()
+    return response.json()
+
+def query_parameter_sets():
+    """Parámetros de cada ejecución de la query: uno por página, o ninguno sin paginado"""
+    if REDASH_FETCH_PAGES > 1:
+        return [{REDASH_PAGE_PARAM: page, REDASH_PAGE_COUNT_PARAM: REDASH_FETCH_PAGES}
+                for page in range(REDASH_FETCH_PAGES)]
+    return [None]
+
+def fetch_redash_page(page):
+    """Ejecutar la query para una página y devolver la respuesta con formato de results.json"""
+    body = submit_redash_query(query_parameter_sets()[page], CACHE_TTL_SECONDS)
+    if "job" in body:
+        body = wait_for_redash_job(body["job"])
+    print(f"📄 Page {page + 1}/{REDASH_FETCH_PAGES}: "
+          f"{len(body.get('query_result', {}).get('data', {}).get('rows', []))} rows")
+    return body
+
+def fetch_redash_pages():
+    """Descargar todas las páginas en paralelo y unirlas en una sola respuesta"""
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=REDASH_FETCH_PAGES, thread_name_prefix="redash-page") as executor:
+        pages = list(executor.map(fetch_redash_page, range(REDASH_FETCH_PAGES)))
+    
+    for page in pages:
+        if "data" not in page.get("query_result", {}):
+            # La validación de fetch_redash_data informará el problema
+            return page
+    rows = []
+    for page in pages:
+        rows.extend(page["query_result"]["data"].get("rows", []))
+    first = pages[0]["query_result"]
+    return {"query_result": dict(first, data=dict(first["data"], rows=rows))}
+
+def get_refresh_pool():
+    """Pool de procesos del refresh (uno por proceso; forkserver/spawn: no se hace fork de un proceso con hilos)"""
+    global refresh_pool, refresh_pool_pid
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with refresh_pool_lock:
+        if refresh_pool is None or refresh_pool_pid != os.getpid():
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            refresh_pool = ProcessPoolExecutor(max_workers=REFRESH_WORKERS, mp_context=context)
+            refresh_pool_pid = os.getpid()
+        return refresh_pool
+
+def shutdown_refresh_pool():
+    """Terminar los procesos del pool de refresh de este proceso"""
+    global refresh_pool
+    with refresh_pool_lock:
+        if refresh_pool is not None and refresh_pool_pid == os.getpid():
+            refresh_pool.shutdown(wait=True)
+        refresh_pool = None
+
+def shard_bounds(total):
+    """Rangos [inicio, fin) en que se reparte un trabajo de total elementos"""
+    if REFRESH_WORKERS < 2 or total < PARALLEL_MIN_ROWS:
+        return [(0, total)]
+    size = -(-total // REFRESH_WORKERS)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+def map_shards(func, tasks):
+    """Ejecutar func(*task) para cada bloque en el pool de procesos, conservando el orden"""
+    global refresh_pool
+    if len(tasks) > 1:
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            pool = get_refresh_pool()
+            futures = [pool.submit(func, *task) for task in tasks]
+            return [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            print(f"⚠️ Refresh pool broken, processing serially: {str(e)}")
+            with refresh_pool_lock:
+                refresh_pool = None
+    return [func(*task) for task in tasks]
+
+def clean_rows_chunk(rows, schema, column_names):
+    """Limpiar un bloque de filas crudas: (filas procesadas, filas inválidas)"""
+    processed_data = []
+    skipped_rows = 0
+    for row in rows:
+        if isinstance(row, dict):
+            # Row es ya un diccionario (formato actual de Redash)
+            row_dict = {}
+            for key, value in row.items():
+                # Limpiar el nombre de la clave
+                clean_key = normalize_column_name(key)
+                row_dict[clean_key] = clean_value(value, schema.get(clean_key))
+            processed_data.append(row_dict)
+            
+        elif isinstance(row, (list, tuple)):
+            # Row es un array (formato alternativo)
+            row_dict = {}
+            for column_name, value in zip(column_names, row):
+                row_dict[column_name] = clean_value(value, schema[column_name])
+            processed_data.append(row_dict)
+        else:
+            skipped_rows += 1
+    return processed_data, skipped_rows
+
+def clean_rows(rows, schema, column_names):
+    """Limpiar todas las filas, en paralelo por bloques si el resultado es grande"""
+    tasks = [(rows[start:end], schema, column_names) for start, end in shard_bounds(len(rows))]
+    parts = map_shards(clean_rows_chunk, tasks)
+    if len(parts) == 1:
+        return parts[0]
+    
+    processed_data = []
+    skipped_rows = 0
+    for part_rows, part_skipped in parts:
+        processed_data.extend(part_rows)
+        skipped_rows += part_skipped
+    # Los categóricos llegan de cada proceso como cadenas nuevas: internarlos de nuevo
+    categories = [column for column, col_type in schema.items() if col_type == 'category']
+    for row in processed_data:
+        for column in categories:
+            value = row.get(column)
+            if isinstance(value, str):
+                row[column] = sys.intern(value)
+    return processed_data, skipped_rows
+
+# ============================================================
+# Re-ejecución de la query en Redash (jobs consultados en segundo plano)
+# ============================================================
+
+# Agenda de re-ejecución: cada REDASH_REFRESH_INTERVAL segundos (0 = desactivado)
+# y/o a horas fijas del día, REDASH_REFRESH_TIMES="06:00,13:30" (hora del servidor)
+REDASH_REFRESH_INTERVAL = int(os.environ.get('REDASH_REFRESH_INTERVAL', 0))
+REDASH_REFRESH_TIMES = os.environ.get('REDASH_REFRESH_TIMES', '')
+
+REDASH_JOB_STATES = {1: "queued", 2: "running", 3: "success", 4: "failed", 5: "cancelled"}
+ACTIVE_REFRESH_STATES = {"queued", "running", "fetching"}
+
+query_refresh_state = {
+    "status": "idle",
+    "trigger": None,
+    "jobs": {},
+    "started_at": None,
+    "finished_at": None,
+    "next_run_at": None,
+    "error": None,
+    "runs": 0
+}
+query_refresh_lock = threading.Lock()
+query_refresh_wakeup = threading.Event()
+query_refresher_thread = None
+
+def parse_refresh_times(text):
+    """Convertir "HH:MM,HH:MM" en [(hora, minuto)], ignorando entradas inválidas"""
+    times = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            hour, minute = (int(part) for part in item.split(':'))
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError(item)
+            times.append((hour, minute))
+        except ValueError:
+            print(f"⚠️ Ignoring invalid refresh time: {item!r}")
+    return times
+
+REFRESH_SCHEDULE_TIMES = parse_refresh_times(REDASH_REFRESH_TIMES)
+REFRESH_SCHEDULED = REDASH_REFRESH_INTERVAL > 0 or bool(REFRESH_SCHEDULE_TIMES)
+
+def next_scheduled_refresh(now, last_run=None):
+    """Timestamp de la próxima re-ejecución programada, o None sin agenda"""
+    candidates = []
+    if REDASH_REFRESH_INTERVAL > 0:
+        last_run = last_run or current_snapshot.retrieved_at or now
+        candidates.append(max(now, last_run + REDASH_REFRESH_INTERVAL))
+    today = datetime.fromtimestamp(now)
+    for hour, minute in REFRESH_SCHEDULE_TIMES:
+        moment = today.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if moment.timestamp() <= now:
+            moment += timedelta(days=1)
+        candidates.append(moment.timestamp())
+    return min(candidates) if candidates else None
+
+def update_query_refresh_state(**changes):
+    """Actualizar el estado de la re-ejecución en curso"""
+    with query_refresh_lock:
+        query_refresh_state.update(changes)
+
+def ensure_query_refresher_running():
+    """Arrancar el hilo que ejecuta la agenda y las re-ejecuciones pedidas"""
+    global query_refresher_thread
+    with query_refresh_lock:
+        if query_refresher_thread is None or not query_refresher_thread.is_alive():
+            query_refresher_thread = threading.Thread(target=query_refresher_loop, name="query-refresher", daemon=True)
+            query_refresher_thread.start()
+
+def trigger_query_refresh(trigger="manual"):
+    """Pedir una re-ejecución sin esperarla: (iniciada, motivo, segundos para reintentar).
+    Comparte el debounce de /force-refresh (FORCE_REFRESH_MIN_INTERVAL)."""
+    ensure_query_refresher_running()
+    with query_refresh_lock:
+        if query_refresh_state["status"] in ACTIVE_REFRESH_STATES:
+            return False, "in_progress", 0
+        retry_after = claim_forced_refresh()
+        if retry_after:
+            return False, "debounced", retry_after
+        query_refresh_state.update(status="queued", trigger=trigger, jobs={}, error=None,
+                                   started_at=time.time(), finished_at=None)
+    query_refresh_wakeup.set()
+    return True, "started", 0
+
+def query_refresher_loop():
+    """Esperar la próxima ejecución programada (o una pedida) y ejecutarla"""
+    last_run = None
+    while True:
+        now = time.time()
+        next_run = next_scheduled_refresh(now, last_run)
+        update_query_refresh_state(next_run_at=next_run)
+        requested = query_refresh_wakeup.wait(None if next_run is None else next_run - now)
+        query_refresh_wakeup.clear()
         
-        if response.status_code != 200:
-            print(f"❌ HTTP Error: {response.status_code}")
-            return {
-                "success": False, 
-                "error": f"HTTP {response.status_code}: {response.text[:200]}",
-                "data": []
+        if requested:
+            run_query_refresh(query_refresh_state["trigger"])
+        elif not preload_mode or is_snapshot_refresher():
+            # En modo preload solo el worker refresher sigue la agenda
+            update_query_refresh_state(status="queued", trigger="schedule", jobs={}, error=None,
+                                       started_at=time.time(), finished_at=None)
+            run_query_refresh("schedule")
+        last_run = time.time()
+
+def run_query_refresh(trigger):
+    """Re-ejecutar la query en Redash, esperar sus jobs y recargar el snapshot"""
+    print(f"🛰️ Re-executing Redash query {REDASH_QUERY_ID} ({trigger})")
+    
+    def track(index, job):
+        with query_refresh_lock:
+            query_refresh_state["jobs"][index] = {
+                "id": job.get("id"),
+                "status": REDASH_JOB_STATES.get(job.get("status"), "unknown")
             }
+            if any(info["status"] == "running" for info in query_refresh_state["jobs"].values()):
+                query_refresh_state["status"] = "running"
+    
+    def execute(index, parameters):
+        body = submit_redash_query(parameters, max_age=0)
+        if "job" in body:
+            track(index, body["job"])
+            poll_redash_job(body["job"], on_update=lambda job: track(index, job))
+    
+    from concurrent.futures import ThreadPoolExecutor
+    try:
+        parameter_sets = query_parameter_sets()
+        with ThreadPoolExecutor(max_workers=len(parameter_sets), thread_name_prefix="redash-job") as executor:
+            list(executor.map(execute, range(len(parameter_sets)), parameter_sets))
         
-        # Log raw response for debugging
-        response_text = response.text
-        print(f"📄 Response length: {len(response_text)} characters")
-        print(f"📄 Response preview: {response_text[:500]}...")
+        # Resultados recién calculados: la descarga normal los toma del cache de Redash
+        update_query_refresh_state(status="fetching")
+        data = coalesce("redash:fetch", lambda: refresh_snapshot(fetch_redash_data))
+        if not data.get("success"):
+            raise RuntimeError(data.get("error"))
+        update_query_refresh_state(status="success", finished_at=time.time())
+        print(f"✅ Redash query re-executed: {len(data.get('data', []))} records")
+    except Exception as e:
+        print(f"❌ Redash query re-execution failed: {str(e)}")
+        update_query_refresh_state(status="failed", finished_at=time.time(), error=str(e))
+    finally:
+        with query_refresh_lock:
+            query_refresh_state["runs"] += 1
+
+def fetch_redash_data():
+    """Descargar y procesar los datos de Redash, actualizando el cache"""
+    try:
+        print("🔄 Fetching fresh data from Redash...")
+        started = time.time()
         
-        raw_data = response.json()
+        if REDASH_FETCH_PAGES > 1:
+            print(f"📚 Fetching {REDASH_FETCH_PAGES} pages in parallel")
+            raw_data = fetch_redash_pages()
+        else:
+            url = redash_url(f"/api/queries/{REDASH_QUERY_ID}/results.json")
+            response = requests.get(url, timeout=30, headers=REDASH_HEADERS)
+            print(f"📡 Redash response status: {response.status_code}")
+            print(f"📡 Response headers: {dict(response.headers)}")
+            
+            if response.status_code != 200:
+                print(f"❌ HTTP Error: {response.status_code}")
+                return {
+                    "success": False, 
+                    "error": f"HTTP {response.status_code}: {response.text[:200]}",
+                    "data": []
+                }
+            
+            # Log raw response for debugging
+            response_text = response.text
+            print(f"📄 Response length: {len(response_text)} characters")
+            print(f"📄 Response preview: {response_text[:500]}...")
+            
+            raw_data = response.json()
+        refresh_stats["download_seconds"] = round(time.time() - started, 3)
         print(f"📊 Raw data structure: {list(raw_data.keys())}")
         
         # Debug the full structure
@@ -133,49 +1017,24 @@ def get_redash_data():
                 }
             }
         
-        # Procesar nombres de columnas
-        column_names = []
-        for i, col in enumerate(columns):
-            if isinstance(col, dict):
-                name = col.get('name', f'column_{i}')
-            else:
-                name = str(col) if col is not None else f'column_{i}'
-            
-            # Limpiar nombre de columna
-            name = name.strip().replace(' ', '_').replace('-', '_').lower()
-            if not name or name == '_':
-                name = f'column_{i}'
-            column_names.append(name)
+        # Procesar nombres de columnas e inferir el esquema tipado
+        schema = infer_schema(columns, rows)
+        column_names = list(schema.keys())
+        
+        field_map = resolve_field_map(column_names)
         
         print(f"📋 Column names: {column_names}")
+        print(f"🧬 Inferred schema: {schema}")
+        print(f"🧭 Field map: {field_map}")
         
         # Procesar filas - El API de Redash devuelve objetos directamente, no arrays
-        processed_data = []
-        for row_idx, row in enumerate(rows):
-            if isinstance(row, dict):
-                # Row es ya un diccionario (formato actual de Redash)
-                print(f"✅ Processing row {row_idx} as dict: {list(row.keys())}")
-                row_dict = {}
-                for key, value in row.items():
-                    # Limpiar el nombre de la clave
-                    clean_key = str(key).strip().replace(' ', '_').replace('-', '_').lower()
-                    cleaned_value = clean_value(value)
-                    row_dict[clean_key] = cleaned_value
-                processed_data.append(row_dict)
-                
-            elif isinstance(row, (list, tuple)):
-                # Row es un array (formato alternativo)
-                print(f"✅ Processing row {row_idx} as array")
-                row_dict = {}
-                for i, value in enumerate(row):
-                    if i < len(column_names):
-                        column_name = column_names[i]
-                        cleaned_value = clean_value(value)
-                        row_dict[column_name] = cleaned_value
-                processed_data.append(row_dict)
-            else:
-                print(f"⚠️ Skipping invalid row {row_idx}: {type(row)} - {row}")
-                continue
+        started = time.time()
+        processed_data, skipped_rows = clean_rows(rows, schema, column_names)
+        refresh_stats["clean_seconds"] = round(time.time() - started, 3)
+        refresh_stats["shards"] = len(shard_bounds(len(rows)))
+        
+        if skipped_rows:
+            print(f"⚠️ Skipped {skipped_rows} invalid rows")
         
         result = {
             "success": True,
@@ -183,8 +1042,12 @@ def get_redash_data():
             "metadata": {
                 "total_records": len(processed_data),
                 "columns": column_names,
+                "schema": schema,
+                "field_map": field_map,
                 "source": "Redash Query 3654",
                 "retrieved_at": datetime.now().isoformat(),
+                # Versión del snapshot (viaja con él a los demás workers): base de los ETag
+                "version": format(time.time_ns() // 1000000, 'x'),
                 "data_cleaned": True,
                 "query_id": "3654",
                 "debug": {
@@ -200,9 +1063,10 @@ def get_redash_data():
         print(f"✅ Successfully processed {len(processed_data)} orders")
         print(f"🔍 Sample processed data: {processed_data[0] if processed_data else 'None'}")
         
-        # Actualizar cache
-        data_cache = result
-        cache_time = time.time()
+        # Compartir con los demás workers (modo preload), publicar y notificar a los suscritos
+        published_at = write_shared_snapshot(result) if preload_mode else None
+        install_snapshot(result, published_at)
+        print(f"⏱️ Refresh timings: {refresh_stats}")
         return result
         
     except requests.exceptions.RequestException as e:
@@ -220,362 +1084,1480 @@ def get_redash_data():
         traceback.print_exc()
         return {"success": False, "error": error_msg, "data": []}
 
+MCP_RESPONSE_HEADERS = {
+    'Content-Type': 'application/json; charset=utf-8',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': '*',
+    'Access-Control-Expose-Headers': 'Mcp-Session-Id, ETag',
+    'Cache-Control': 'no-cache',
+    'X-MCP-Protocol': '2024-11-05',
+    'X-MCP-Server': 'redash-orders-server'
+}
+
 def create_mcp_response(data, status=200):
     """Crear respuesta MCP con headers específicos para Claude Desktop"""
     response = make_response(jsonify(data), status)
-    response.headers.update({
-        'Content-Type': 'application/json; charset=utf-8',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-        'Access-Control-Allow-Headers': '*',
-        'Cache-Control': 'no-cache',
-        'X-MCP-Protocol': '2024-11-05',
-        'X-MCP-Server': 'redash-orders-server'
-    })
+    response.headers.update(MCP_RESPONSE_HEADERS)
     return response
 
-@app.before_request
-def handle_preflight():
-    if request.method == "OPTIONS":
-        response = make_response()
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        response.headers.add('Access-Control-Allow-Headers', "*")
-        response.headers.add('Access-Control-Allow-Methods', "*")
+def create_raw_response(body, status=200):
+    """Crear respuesta MCP a partir de bytes JSON ya serializados"""
+    response = Response(body, status)
+    response.headers.update(MCP_RESPONSE_HEADERS)
+    return response
+
+# Validadores HTTP (ETag / 304) para los endpoints GET de solo lectura
+def snapshot_version(data):
+    """Versión del snapshot servido, o None si no hay datos válidos"""
+    if not data.get("success"):
+        return None
+    return data.get("metadata", {}).get("version")
+
+def request_etag(version, extra=None):
+    """ETag de la petición: versión del snapshot + ruta, argumentos normalizados y valores implícitos"""
+    key = json.dumps([request.path, sorted(request.args.items(multi=True)), extra], ensure_ascii=False)
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+    return f"{version}-{digest}"
+
+def cache_max_age():
+    """Segundos que le quedan al snapshot actual antes del próximo refresh"""
+    retrieved_at = get_snapshot().retrieved_at
+    if not retrieved_at:
+        return 0
+    return max(0, int(CACHE_TTL_SECONDS - (time.time() - retrieved_at)))
+
+def conditional_endpoint(func=None, *, etag_extra=None):
+    """Responder 304 si el cliente ya tiene la versión actual (If-None-Match).
+    etag_extra() agrega al ETag valores por defecto que no vienen en la URL (p. ej. la fecha de hoy)"""
+    if func is None:
+        return functools.partial(conditional_endpoint, etag_extra=etag_extra)
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        version = snapshot_version(get_redash_data())
+        if version is None:
+            return func(*args, **kwargs)
+        
+        etag = request_etag(version, etag_extra() if etag_extra else None)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.headers.update(MCP_RESPONSE_HEADERS)
+            del response.headers['Content-Type']
+        else:
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        # ETag débil: el cuerpo puede viajar comprimido o no según Accept-Encoding
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = f"public, max-age={cache_max_age()}, must-revalidate"
+        response.vary.add('Accept-Encoding')
         return response
+    return wrapper
 
-@app.route("/", methods=["GET", "POST", "OPTIONS"])
-def mcp_endpoint():
-    """Endpoint principal optimizado para Claude Desktop MCP"""
+# Compresión negociada con Accept-Encoding (brotli si está instalado, si no gzip)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/csv', 'application/x-ndjson'}
+
+def choose_encoding(accept_encoding):
+    """Elegir la codificación preferida por el cliente entre las disponibles"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
     
-    if request.method == "OPTIONS":
-        return create_mcp_response({})
+    wildcard = accepted.get('*', 0.0)
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+def compress_body(body, encoding):
+    """Comprimir bytes con la codificación elegida"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    """Comprimir una respuesta en streaming bloque a bloque"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+@app.after_request
+def compress_response(response):
+    """Comprimir respuestas JSON/texto grandes si el cliente lo acepta"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
     
-    if request.method == "GET":
-        return create_mcp_response({
-            "name": "Redash Orders MCP Server",
-            "version": "1.0.0",
-            "description": "MCP server for Redash orders data - Claude Desktop compatible",
-            "protocol": "Model Context Protocol v2024-11-05",
-            "status": "running",
-            "auth_required": False,
-            "capabilities": {
-                "resources": {"subscribe": False, "listChanged": False},
-                "tools": {"listChanged": False}
-            },
-            "compatibility": {
-                "claude_desktop": True,
-                "protocol_version": "2024-11-05"
-            }
-        })
+    response.vary.add('Accept-Encoding')
+    if (response.content_length or 0) < COMPRESSION_MIN_BYTES:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
     
-    if request.method == "POST":
-        try:
-            if not request.is_json:
-                return create_mcp_response({
-                    "jsonrpc": "2.0",
-                    "error": {"code": -32700, "message": "Content must be JSON"},
-                    "id": None
-                }, 400)
-            
-            rpc_request = request.get_json()
-            if not rpc_request:
-                return create_mcp_response({
-                    "jsonrpc": "2.0",
-                    "error": {"code": -32700, "message": "Empty request body"},
-                    "id": None
-                }, 400)
-            
-            if not isinstance(rpc_request, dict) or 'method' not in rpc_request:
-                return create_mcp_response({
-                    "jsonrpc": "2.0",
-                    "error": {"code": -32600, "message": "Invalid JSON-RPC request"},
-                    "id": rpc_request.get('id')
-                }, 400)
-            
-            return handle_mcp_request(rpc_request)
-            
-        except Exception as e:
-            return create_mcp_response({
-                "jsonrpc": "2.0",
-                "error": {"code": -32603, "message": f"Internal error: {str(e)}"},
-                "id": None
-            }, 500)
+    response.set_data(compress_body(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
-def handle_mcp_request(rpc_request):
-    """Manejar peticiones JSON-RPC del protocolo MCP"""
-    method = rpc_request.get('method')
-    params = rpc_request.get('params', {})
-    request_id = rpc_request.get('id')
+# ============================================================
+# Sesiones MCP, suscripciones a recursos y notificaciones SSE
+# ============================================================
+
+ORDERS_COLLECTION_URI = "orders://all"
+# Las sesiones viven en la memoria de un proceso: con varios workers de gunicorn,
+# initialize, resources/subscribe y el stream SSE pueden caer en workers distintos.
+# gunicorn_preload.conf.py las desactiva con más de un worker (o fuerza workers=1)
+SUBSCRIPTIONS_ENABLED = os.environ.get('ENABLE_SUBSCRIPTIONS', 'true').lower() in ('1', 'true', 'yes')
+SSE_QUEUE_SIZE = 100
+SSE_KEEPALIVE_SECONDS = 15
+# Sesiones sin stream: se descartan tras SESSION_IDLE_TIMEOUT o, pasado
+# MAX_SESSIONS, la menos usada recientemente (initialize no consume rate limit)
+SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT', 600))
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 1000))
+MAX_DELTA_ORDERS = 100
+
+# Orden de uso: las menos recientes primero (get_session las mueve al final)
+mcp_sessions = collections.OrderedDict()
+sessions_lock = threading.Lock()
+notifier_thread = None
+notifier_lock = threading.Lock()
+
+# Índice por clave primaria (Snapshot.order_index): {clave de orden: [filas]},
+# con el orden estable de claves en Snapshot.order_keys
+RESOURCES_PAGE_SIZE = 100
+
+def get_order_key(order, key_columns=ORDER_KEY_FIELDS):
+    """Obtener la clave primaria lógica de una orden"""
+    for field in key_columns:
+        value = order.get(field)
+        if value is not None and value != "":
+            return str(value)
+    return None
+
+def order_digest(order):
+    """Hash compacto del contenido de una orden para detectar cambios"""
+    return hash(tuple(order.items()))
+
+def compute_digests(orders, key_columns=ORDER_KEY_FIELDS):
+    """Mapa {clave de orden: hash de sus filas} para un snapshot"""
+    digests = {}
+    for order in orders:
+        if isinstance(order, dict):
+            digest = order_digest(order)
+            key = get_order_key(order, key_columns) or f"row-{digest}"
+            previous = digests.get(key)
+            # Varias filas con la misma clave (p. ej. una por ítem): combinar sus hashes
+            digests[key] = digest if previous is None else hash((previous, digest))
+    return digests
+
+def diff_digests(old_digests, new_digests):
+    """Claves que cambiaron entre dos snapshots: {clave: (hash anterior, hash nuevo)}"""
+    changes = {key: (old_digests.get(key), digest) for key, digest in new_digests.items()
+               if old_digests.get(key) != digest}
+    for key, digest in old_digests.items():
+        if key not in new_digests:
+            changes[key] = (digest, None)
+    return changes
+
+# Historial acotado de versiones del snapshot; cada una guarda solo los
+# hashes de las claves que cambiaron respecto de la anterior
+SNAPSHOT_HISTORY_SIZE = max(1, int(os.environ.get('SNAPSHOT_HISTORY_SIZE', 48)))
+
+def record_snapshot_version(history, version, retrieved_time, changes):
+    """Historial (tupla) con la nueva versión agregada; changes=None inicia uno nuevo"""
+    if history and history[-1]["version"] == version:
+        return history
+    entry = {"version": version, "retrieved_at": retrieved_time, "changes": changes or {}}
+    if changes is None:
+        return (entry,)
+    return (history + (entry,))[-SNAPSHOT_HISTORY_SIZE:]
+
+def changes_since(history, version=None, since=None):
+    """Inserciones, actualizaciones y borrados desde una versión o timestamp.
+    None si la base ya salió del historial (el cliente debe resincronizar)."""
+    if not history:
+        return None
+    if version:
+        positions = [position for position, entry in enumerate(history) if entry["version"] == version]
+        base = positions[-1] if positions else None
+    elif since is not None:
+        positions = [position for position, entry in enumerate(history) if entry["retrieved_at"] <= since]
+        base = positions[-1] if positions else None
+    else:
+        # Sin base: lo que cambió en el último refresh
+        base = max(len(history) - 2, 0)
+    if base is None:
+        return None
     
-    if method == "initialize":
-        return create_mcp_response({
-            "jsonrpc": "2.0",
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "resources": {
-                        "subscribe": False,
-                        "listChanged": False
-                    },
-                    "tools": {
-                        "listChanged": False
-                    }
-                },
-                "serverInfo": {
-                    "name": "redash-orders-server",
-                    "version": "1.0.0"
-                }
-            },
-            "id": request_id
-        })
+    # Componer los cambios: primer hash anterior y último hash nuevo de cada clave
+    net = {}
+    for entry in history[base + 1:]:
+        for key, (old_digest, new_digest) in entry["changes"].items():
+            net[key] = (net[key][0] if key in net else old_digest, new_digest)
+    inserted, updated, deleted = [], [], []
+    for key, (old_digest, new_digest) in net.items():
+        if old_digest is None and new_digest is not None:
+            inserted.append(key)
+        elif new_digest is None and old_digest is not None:
+            deleted.append(key)
+        elif old_digest != new_digest:
+            updated.append(key)
+    return {
+        "base_version": history[base]["version"],
+        "base_retrieved_at": history[base]["retrieved_at"],
+        "current_version": history[-1]["version"],
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": deleted
+    }
+
+def build_order_index(orders, key_columns=ORDER_KEY_FIELDS):
+    """Índice por clave primaria usado por resources/list y resources/read: (índice, claves)"""
+    index = {}
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+        key = get_order_key(order, key_columns)
+        if key is not None:
+            index.setdefault(key, []).append(order)
+    print(f"🗂️ Indexed {len(index)} orders by primary key")
+    return index, list(index.keys())
+
+# Índices de búsqueda aproximada (trigramas) por tipo de campo: "email", "order_number"
+# (Snapshot.fuzzy_indexes)
+FUZZY_MIN_SIMILARITY = 0.3
+FUZZY_MAX_CANDIDATES = 200
+FUZZY_MAX_POSTING = 5000
+
+def trigrams(text):
+    """Trigramas de un texto con relleno (estilo pg_trgm)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_trigram_index(orders, columns):
+    """Construir índice de trigramas sobre los valores distintos de las columnas dadas"""
+    value_ids = {}
+    values = []
+    value_rows = []
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+        for column in columns:
+            value = order.get(column)
+            if value is None or value == "":
+                continue
+            text = str(value).strip().lower()
+            value_id = value_ids.get(text)
+            if value_id is None:
+                value_id = value_ids[text] = len(values)
+                values.append(text)
+                value_rows.append([])
+            rows = value_rows[value_id]
+            if not rows or rows[-1] is not order:
+                rows.append(order)
+    
+    tasks = [(values[start:end], start) for start, end in shard_bounds(len(values))]
+    postings = merge_postings(map_shards(trigram_postings_chunk, tasks))
+    return {"values": values, "rows": value_rows, "postings": postings}
+
+def trigram_postings_chunk(values, first_value_id):
+    """Listas de trigramas → ids de valor para un bloque de valores"""
+    postings = {}
+    for value_id, text in enumerate(values, first_value_id):
+        for gram in trigrams(text):
+            postings.setdefault(gram, []).append(value_id)
+    return postings
+
+def merge_postings(parts):
+    """Unir listas invertidas parciales (en orden de bloque, los ids quedan ordenados)"""
+    postings = parts[0] if parts else {}
+    for part in parts[1:]:
+        for term, ids in part.items():
+            existing = postings.get(term)
+            if existing is None:
+                postings[term] = ids
+            else:
+                existing.extend(ids)
+    return postings
+
+def build_fuzzy_indexes(orders, field_map):
+    """Construir los índices aproximados de email y número de orden en el refresh"""
+    indexes = {
+        "email": build_trigram_index(orders, field_map["email_columns"]),
+        "order_number": build_trigram_index(orders, field_map["key_columns"])
+    }
+    sizes = {kind: len(index["values"]) for kind, index in indexes.items()}
+    print(f"🔤 Fuzzy indexes built: {sizes}")
+    return indexes
+
+def fuzzy_search(kind, term, limit=10, min_similarity=FUZZY_MIN_SIMILARITY):
+    """Buscar valores similares: lista de (valor, similitud, filas) ordenada por relevancia"""
+    index = get_snapshot().fuzzy_indexes.get(kind)
+    term = str(term).strip().lower()
+    if not index or not term:
+        return []
+    
+    query_grams = trigrams(term)
+    postings = index["postings"]
+    # Recorrer primero los trigramas más selectivos; los muy frecuentes
+    # (dominios de email, prefijos comunes) se omiten si ya hay candidatos
+    shared = {}
+    for gram in sorted(query_grams, key=lambda g: len(postings.get(g, ()))):
+        value_ids = postings.get(gram)
+        if not value_ids:
+            continue
+        if shared and len(value_ids) > FUZZY_MAX_POSTING:
+            break
+        for value_id in value_ids:
+            shared[value_id] = shared.get(value_id, 0) + 1
+    
+    # Similitud exacta (coeficiente de Dice) solo para los mejores candidatos
+    values = index["values"]
+    candidates = heapq.nlargest(FUZZY_MAX_CANDIDATES, shared, key=shared.get)
+    scored = []
+    for value_id in candidates:
+        value_grams = trigrams(values[value_id])
+        similarity = 2 * len(query_grams & value_grams) / (len(query_grams) + len(value_grams))
+        if similarity >= min_similarity:
+            scored.append((similarity, value_id))
+    
+    # Empates: primero el valor de longitud más parecida al término
+    scored.sort(key=lambda item: (-item[0], abs(len(values[item[1]]) - len(term))))
+    return [(values[value_id], similarity, index["rows"][value_id]) for similarity, value_id in scored[:limit]]
+
+def fuzzy_suggestions_text(kind, term, limit=3):
+    """Texto '¿Quisiste decir…?' con los valores más parecidos"""
+    suggestions = fuzzy_search(kind, term, limit)
+    if not suggestions:
+        return ""
+    return "\n**¿Quisiste decir?** " + ", ".join(f"`{value}`" for value, _, _ in suggestions) + "\n"
+
+def fuzzy_matching_orders(kind, term, limit):
+    """Órdenes de una búsqueda aproximada con su similitud: [(orden, similitud)]"""
+    matches = []
+    for value, similarity, rows in fuzzy_search(kind, term, limit):
+        for order in rows:
+            matches.append((order, similarity))
+            if len(matches) >= limit:
+                return matches
+    return matches
+
+# Índice invertido de texto completo (BM25 con boosts por campo), en Snapshot.text_index
+BM25_K1 = 1.2
+BM25_B = 0.75
+TEXT_MIN_RELATIVE_SCORE = 0.1
+TEXT_COMMON_TERM_RATIO = 0.5
+TEXT_COMMON_TERM_SCAN = 1000
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+SPANISH_STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'se', 'su', 'sus', 'un', 'una', 'unos', 'unas', 'y'
+}
+# Peso de cada campo lógico en el ranking; el resto de columnas de texto pesa 1
+TEXT_FIELD_BOOSTS = {'order_number': 3.0, 'email': 2.0, 'customer': 2.0, 'status': 1.5}
+
+def fold_text(text):
+    """Pasar a minúsculas y quitar tildes (á→a, ñ→n) para comparar texto en español"""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def tokenize(text):
+    """Tokenizar texto plegado, descartando stopwords en español"""
+    return [token for token in TOKEN_PATTERN.findall(fold_text(text)) if token not in SPANISH_STOPWORDS]
+
+def build_text_index(orders, schema, field_map):
+    """Construir el índice invertido sobre todas las columnas de texto del snapshot"""
+    boosts = {}
+    for field_type, column in field_map["fields"].items():
+        if field_type in TEXT_FIELD_BOOSTS:
+            boosts[column] = TEXT_FIELD_BOOSTS[field_type]
+    for column in field_map["key_columns"]:
+        boosts.setdefault(column, TEXT_FIELD_BOOSTS['order_number'])
+    text_columns = [column for column, col_type in schema.items()
+                    if col_type in ('string', 'category') or column in boosts]
+    
+    # Cada bloque de órdenes se tokeniza en un proceso; solo viajan los valores de texto
+    doc_orders = [order for order in orders if isinstance(order, dict)]
+    column_boosts = [boosts.get(column, 1.0) for column in text_columns]
+    tasks = [([[order.get(column) for column in text_columns] for order in doc_orders[start:end]], start, column_boosts)
+             for start, end in shard_bounds(len(doc_orders))]
+    parts = map_shards(text_postings_chunk, tasks)
+    postings = merge_postings([part_postings for part_postings, _ in parts])
+    doc_lengths = [length for _, part_lengths in parts for length in part_lengths]
+    
+    text_index = {
+        "postings": postings,
+        "orders": doc_orders,
+        "lengths": doc_lengths,
+        "avg_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+        "columns": text_columns
+    }
+    print(f"📚 Text index built: {len(postings)} terms over {len(text_columns)} columns")
+    return text_index
+
+def text_postings_chunk(doc_values, first_doc_id, column_boosts):
+    """Listas invertidas [(doc, peso)] y longitudes de un bloque de documentos"""
+    postings = {}
+    lengths = []
+    for doc_id, values in enumerate(doc_values, first_doc_id):
+        term_weights = {}
+        length = 0.0
+        for value, boost in zip(values, column_boosts):
+            if value is None or value == "":
+                continue
+            for token in tokenize(value):
+                term_weights[token] = term_weights.get(token, 0.0) + boost
+                length += boost
+        for token, weight in term_weights.items():
+            postings.setdefault(token, []).append((doc_id, weight))
+        lengths.append(length)
+    return postings, lengths
+
+def text_search(query, limit=10, snapshot=None):
+    """Buscar órdenes por texto libre: [(orden, puntaje BM25)] ordenado por relevancia"""
+    index = (snapshot or get_snapshot()).text_index
+    terms = set(tokenize(query))
+    if not index or not terms:
+        return []
+    
+    total_docs = len(index["orders"])
+    lengths = index["lengths"]
+    avg_length = index["avg_length"] or 1.0
+    scores = {}
+    # Términos raros primero; los que aparecen en más de la mitad de las
+    # órdenes apenas aportan (idf ≈ 0) y se omiten si ya hay candidatos
+    term_postings_list = sorted((index["postings"].get(term, []) for term in terms), key=len)
+    for term_postings in term_postings_list:
+        if not term_postings:
+            continue
+        doc_freq = len(term_postings)
+        if doc_freq > total_docs * TEXT_COMMON_TERM_RATIO:
+            if scores:
+                break
+            # Consulta solo con términos comunes: acotar el recorrido
+            term_postings = term_postings[:TEXT_COMMON_TERM_SCAN]
+        idf = math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        for doc_id, weight in term_postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight * (BM25_K1 + 1) / (weight + norm)
     
-    elif method == "initialized":
+    top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    # Descartar coincidencias solo por términos presentes en casi todas las órdenes
+    min_score = top[0][1] * TEXT_MIN_RELATIVE_SCORE if top else 0.0
+    return [(index["orders"][doc_id], score) for doc_id, score in top if score >= min_score]
+
+# Series de tiempo: contadores por bucket (día, semana, mes) y estado,
+# mantenidos de forma incremental con los cambios de cada refresh
+TIMESERIES_GRANULARITIES = ('day', 'week', 'month')
+ALL_STATUSES = '*'
+
+def bucket_start(granularity, day):
+    """Ordinal del primer día del bucket que contiene el día (ordinal) dado"""
+    if granularity == 'day':
+        return day
+    moment = date.fromordinal(day)
+    if granularity == 'week':
+        return day - moment.weekday()
+    return day - moment.day + 1
+
+def previous_bucket(granularity, bucket):
+    """Ordinal del bucket anterior"""
+    if granularity == 'day':
+        return bucket - 1
+    if granularity == 'week':
+        return bucket - 7
+    return bucket_start('month', bucket - 1)
+
+def order_contribution(order, columns):
+    """(día, estado, total) con que una orden aporta a las series, o None sin fecha"""
+    date_column, status_column, total_column = columns
+    moment = order.get(date_column)
+    if not isinstance(moment, date):
+        return None
+    total = order.get(total_column) if total_column else None
+    if isinstance(total, bool) or not isinstance(total, (int, float, Decimal)):
+        total = None
+    elif not isinstance(total, Decimal):
+        total = Decimal(str(total))
+    return (moment.toordinal(), order.get(status_column) if status_column else None, total)
+
+def apply_contributions(counts, totals, contributions, sign):
+    """Sumar (sign=1) o restar (sign=-1) aportes a los contadores de cada bucket"""
+    for day, status, total in contributions:
+        for granularity in TIMESERIES_GRANULARITIES:
+            bucket = bucket_start(granularity, day)
+            for status_key in (status, ALL_STATUSES):
+                key = (granularity, bucket, status_key)
+                count = counts.get(key, 0) + sign
+                if count:
+                    counts[key] = count
+                    if total is not None:
+                        totals[key] = totals.get(key, 0) + sign * total
+                else:
+                    counts.pop(key, None)
+                    totals.pop(key, None)
+
+def collect_contributions(orders, columns, key_columns, keys=None):
+    """Aportes agrupados por clave de digest (solo las claves dadas, si se indican)"""
+    contributions = {}
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+        key = get_order_key(order, key_columns) or f"row-{order_digest(order)}"
+        if keys is not None and key not in keys:
+            continue
+        contribution = order_contribution(order, columns)
+        rows = contributions.setdefault(key, [])
+        if contribution is not None:
+            rows.append(contribution)
+    return contributions
+
+def update_timeseries(orders, field_map, changes, state):
+    """Contadores del snapshot nuevo: los del anterior (state) más lo que cambió"""
+    fields = field_map["fields"]
+    key_columns = field_map["key_columns"]
+    columns = (fields.get("date"), fields.get("status"), fields.get("total"))
+    started = time.time()
+    
+    if not columns[0]:
+        return {"columns": columns, "counts": {}, "totals": {}, "contributions": {}}
+    
+    incremental = bool(state) and state["columns"] == columns and changes is not None
+    if incremental:
+        changed = {key for key, (_, new_digest) in changes.items() if new_digest is not None}
+        removed = [key for key, (_, new_digest) in changes.items() if new_digest is None]
+        incremental = len(changed) <= len(orders) // 2
+    if not incremental:
+        # Primera carga, esquema distinto o casi todo cambió: reconstruir
+        contributions = collect_contributions(orders, columns, key_columns)
+        counts, totals = {}, {}
+        for rows in contributions.values():
+            apply_contributions(counts, totals, rows, 1)
+        mode = "rebuilt"
+    else:
+        # Copias: el snapshot anterior sigue sirviendo hasta el cambio de referencia
+        counts, totals = dict(state["counts"]), dict(state["totals"])
+        contributions = dict(state["contributions"])
+        for key in removed:
+            apply_contributions(counts, totals, contributions.pop(key, ()), -1)
+        if changed:
+            fresh = collect_contributions(orders, columns, key_columns, changed)
+            for key in changed:
+                apply_contributions(counts, totals, contributions.get(key, ()), -1)
+                contributions[key] = fresh.get(key, [])
+                apply_contributions(counts, totals, contributions[key], 1)
+        mode = f"updated +~{len(changed)} -{len(removed)}"
+    
+    print(f"📅 Time series {mode}: {len(counts)} buckets in {time.time() - started:.3f}s")
+    return {"columns": columns, "counts": counts, "totals": totals, "contributions": contributions}
+
+def timeseries_values(granularity, buckets, status=ALL_STATUSES):
+    """(cantidad, total) por bucket, leídos de los contadores precalculados"""
+    series = get_snapshot().timeseries
+    counts, totals = series.get("counts", {}), series.get("totals", {})
+    return [(counts.get((granularity, bucket, status), 0), totals.get((granularity, bucket, status)))
+            for bucket in buckets]
+
+def create_session():
+    """Registrar una nueva sesión MCP y devolver su identificador"""
+    session_id = uuid.uuid4().hex
+    with sessions_lock:
+        cleanup_sessions()
+        evict_sessions(MAX_SESSIONS - 1)
+        mcp_sessions[session_id] = {
+            "queue": queue.Queue(maxsize=SSE_QUEUE_SIZE),
+            "subscriptions": set(),
+            "last_seen": time.time(),
+            "streaming": False
+        }
+    return session_id
+
+def get_session(session_id):
+    """Obtener sesión activa (actualizando su última actividad)"""
+    if not session_id:
+        return None
+    with sessions_lock:
+        session = mcp_sessions.get(session_id)
+        if session:
+            session["last_seen"] = time.time()
+            mcp_sessions.move_to_end(session_id)
+        return session
+
+def cleanup_sessions():
+    """Eliminar sesiones inactivas sin stream abierto (llamar con sessions_lock tomado)"""
+    now = time.time()
+    expired = [sid for sid, session in mcp_sessions.items()
+               if not session["streaming"] and now - session["last_seen"] > SESSION_IDLE_TIMEOUT]
+    for sid in expired:
+        del mcp_sessions[sid]
+
+def evict_sessions(limit):
+    """Descartar las sesiones sin stream menos usadas hasta quedar en limit
+    (llamar con sessions_lock tomado; los streams abiertos no se tocan)"""
+    excess = len(mcp_sessions) - limit
+    if excess <= 0:
+        return
+    evicted = [sid for sid, session in mcp_sessions.items() if not session["streaming"]][:excess]
+    for sid in evicted:
+        del mcp_sessions[sid]
+    print(f"🧹 Evicted {len(evicted)} idle MCP sessions (limit {MAX_SESSIONS})")
+
+def send_notification(session_id, session, message):
+    """Encolar una notificación JSON-RPC para una sesión; descarta clientes lentos"""
+    try:
+        session["queue"].put_nowait(message)
+    except queue.Full:
+        print(f"⚠️ SSE queue full for session {session_id}, dropping session")
+        mcp_sessions.pop(session_id, None)
+
+def publish_data_changes(orders, key_columns=ORDER_KEY_FIELDS, changes=None):
+    """Notificar a los suscriptores los cambios respecto del snapshot anterior"""
+    if not changes:
+        return
+    with sessions_lock:
+        has_subscribers = any(session["subscriptions"] for session in mcp_sessions.values())
+    if not has_subscribers:
+        return
+    
+    added = [key for key, (old_digest, _) in changes.items() if old_digest is None]
+    removed = [key for key, (_, new_digest) in changes.items() if new_digest is None]
+    updated = [key for key, (old_digest, new_digest) in changes.items()
+               if old_digest is not None and new_digest is not None]
+    
+    print(f"📣 Data changed: +{len(added)} ~{len(updated)} -{len(removed)}")
+    changed_keys = set(added[:MAX_DELTA_ORDERS]) | set(updated[:MAX_DELTA_ORDERS])
+    changed_orders = [order for order in orders
+                      if isinstance(order, dict) and get_order_key(order, key_columns) in changed_keys]
+    delta = {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "orders": changed_orders,
+        "truncated": len(added) > MAX_DELTA_ORDERS or len(updated) > MAX_DELTA_ORDERS,
+        "retrieved_at": datetime.now().isoformat()
+    }
+    
+    with sessions_lock:
+        for session_id, session in list(mcp_sessions.items()):
+            subscriptions = session["subscriptions"]
+            if not subscriptions:
+                continue
+            if ORDERS_COLLECTION_URI in subscriptions:
+                send_notification(session_id, session, {
+                    "jsonrpc": "2.0",
+                    "method": "notifications/resources/updated",
+                    "params": {"uri": ORDERS_COLLECTION_URI, "changes": delta}
+                })
+            for key in updated:
+                uri = f"orders://{key}"
+                if uri in subscriptions:
+                    send_notification(session_id, session, {
+                        "jsonrpc": "2.0",
+                        "method": "notifications/resources/updated",
+                        "params": {"uri": uri}
+                    })
+            if added or removed:
+                send_notification(session_id, session, {
+                    "jsonrpc": "2.0",
+                    "method": "notifications/resources/list_changed"
+                })
+
+def ensure_notifier_running():
+    """Iniciar el hilo que refresca los datos mientras haya suscriptores"""
+    global notifier_thread
+    with notifier_lock:
+        if notifier_thread is None or not notifier_thread.is_alive():
+            notifier_thread = threading.Thread(target=notifier_loop, name="mcp-notifier", daemon=True)
+            notifier_thread.start()
+
+def notifier_loop():
+    """Refrescar el cache al vencer el TTL para generar notificaciones de cambios"""
+    global notifier_thread
+    while True:
+        time.sleep(CACHE_TTL_SECONDS)
+        # Con notifier_lock: una suscripción nueva ve este hilo vivo o arranca otro
+        with notifier_lock:
+            with sessions_lock:
+                has_subscribers = any(session["subscriptions"] for session in mcp_sessions.values())
+            if not has_subscribers:
+                notifier_thread = None
+                print("🔕 No subscribers left, stopping notifier")
+                return
+        try:
+            get_redash_data()
+        except Exception as e:
+            print(f"❌ Notifier refresh failed: {str(e)}")
+
+def sse_stream(session_id, session):
+    """Generador SSE con los mensajes pendientes de la sesión"""
+    event_id = 0
+    session["streaming"] = True
+    try:
+        yield ": stream opened\n\n"
+        while mcp_sessions.get(session_id) is session:
+            try:
+                message = session["queue"].get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            event_id += 1
+            payload = json.dumps(message, ensure_ascii=False, default=json_default)
+            yield f"id: {event_id}\nevent: message\ndata: {payload}\n\n"
+    finally:
+        session["streaming"] = False
+        session["last_seen"] = time.time()
+
+def open_sse_stream():
+    """Abrir el stream SSE (GET /) para mensajes iniciados por el servidor"""
+    if not SUBSCRIPTIONS_ENABLED:
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {},
-            "id": request_id
-        })
-    
-    elif method == "tools/list":
+            "error": {"code": -32601, "message": "SSE notifications are disabled on this server (multiple workers)"},
+            "id": None
+        }, 405)
+    session_id = request.headers.get('Mcp-Session-Id')
+    session = get_session(session_id)
+    if not session:
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {
-                "tools": [
-                    {
-                        "name": "list_orders",
-                        "description": "Retrieve all orders from Redash database with optional limit and format options.",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "limit": {
-                                    "type": "integer",
-                                    "description": "Maximum number of orders to return (default: 20, max: 100)",
-                                    "default": 20,
-                                    "minimum": 1,
-                                    "maximum": 100
-                                },
-                                "format": {
-                                    "type": "string",
-                                    "enum": ["summary", "detailed", "json"],
-                                    "description": "Output format - summary: key fields only, detailed: all fields, json: raw data",
-                                    "default": "summary"
-                                }
-                            },
-                            "additionalProperties": False
-                        }
-                    },
-                    {
-                        "name": "search_orders_by_number",
-                        "description": "Search for orders by order number. Supports exact match and partial search.",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "order_number": {
-                                    "type": "string",
-                                    "description": "Order number to search for (can be partial)"
-                                },
-                                "exact_match": {
-                                    "type": "boolean",
-                                    "description": "Whether to use exact match (true) or partial search (false)",
-                                    "default": False
-                                },
-                                "limit": {
-                                    "type": "integer",
-                                    "description": "Maximum results to return",
-                                    "default": 10,
-                                    "minimum": 1,
-                                    "maximum": 50
-                                }
-                            },
-                            "required": ["order_number"],
-                            "additionalProperties": False
-                        }
-                    },
-                    {
-                        "name": "search_orders_by_email",
-                        "description": "Search for orders by customer email address. Supports exact match and partial search.",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "email": {
-                                    "type": "string",
-                                    "description": "Email address to search for (can be partial)"
-                                },
-                                "exact_match": {
-                                    "type": "boolean",
-                                    "description": "Whether to use exact match (true) or partial search (false)",
-                                    "default": False
-                                },
-                                "limit": {
-                                    "type": "integer",
-                                    "description": "Maximum results to return",
-                                    "default": 10,
-                                    "minimum": 1,
-                                    "maximum": 50
-                                }
-                            },
-                            "required": ["email"],
-                            "additionalProperties": False
-                        }
-                    },
-                    {
-                        "name": "get_orders_stats",
-                        "description": "Get statistical overview and metadata about the orders database.",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {},
-                            "additionalProperties": False
-                        }
-                    }
-                ]
-            },
-            "id": request_id
-        })
-    
-    elif method == "tools/call":
-        tool_name = params.get("name")
-        args = params.get("arguments", {})
-        
-        if tool_name == "list_orders":
-            return handle_list_orders(args, request_id)
-        elif tool_name == "search_orders_by_number":
-            return handle_search_by_order_number(args, request_id)
-        elif tool_name == "search_orders_by_email":
-            return handle_search_by_email(args, request_id)
-        elif tool_name == "get_orders_stats":
-            return handle_get_orders_stats(request_id)
-        else:
-            return create_mcp_response({
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32601,
-                    "message": f"Unknown tool: {tool_name}",
-                    "data": {"available_tools": ["list_orders", "search_orders_by_number", "search_orders_by_email", "get_orders_stats"]}
-                },
-                "id": request_id
-            })
+            "error": {"code": -32001, "message": "Unknown or missing Mcp-Session-Id; call initialize first"},
+            "id": None
+        }, 404 if session_id else 400)
     
-    elif method == "resources/list":
+    response = Response(stream_with_context(sse_stream(session_id, session)), mimetype="text/event-stream")
+    response.headers.update({
+        'Access-Control-Expose-Headers': 'Mcp-Session-Id, ETag',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Access-Control-Allow-Origin': '*',
+        'Mcp-Session-Id': session_id
+    })
+    return response
+
+def handle_resource_subscription(params, request_id, subscribe):
+    """Manejar resources/subscribe y resources/unsubscribe"""
+    if not SUBSCRIPTIONS_ENABLED:
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {"resources": []},
+            "error": {"code": -32601, "message": "Resource subscriptions are disabled on this server (multiple workers)"},
             "id": request_id
         })
+    session = get_session(request.headers.get('Mcp-Session-Id'))
+    uri = params.get("uri") if isinstance(params, dict) else None
     
-    elif method == "prompts/list":
+    if not session:
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {"prompts": []},
+            "error": {"code": -32001, "message": "Subscriptions require an Mcp-Session-Id from initialize"},
             "id": request_id
         })
-    
-    elif method == "ping":
+    if not uri or not str(uri).startswith("orders://"):
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {"status": "pong", "timestamp": datetime.now().isoformat()},
+            "error": {"code": -32602, "message": f"Invalid resource uri: {uri}"},
             "id": request_id
         })
     
-    else:
-        return create_mcp_response({
+    with sessions_lock:
+        if subscribe:
+            session["subscriptions"].add(uri)
+        else:
+            session["subscriptions"].discard(uri)
+    if subscribe:
+        ensure_notifier_running()
+        # Asegurar un snapshot base para poder calcular deltas
+        if not get_snapshot().digests:
+            get_redash_data()
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {},
+        "id": request_id
+    })
+
+@app.before_request
+def ensure_warmup():
+    """En modo de arranque rápido, la primera petición (p. ej. /health) dispara la carga"""
+    if FAST_START:
+        start_warmup()
+
+@app.before_request
+def ensure_query_schedule():
+    """Con agenda configurada, la primera petición arranca el hilo de re-ejecución
+    (sin __main__ ni gunicorn_preload.conf.py, p. ej. `gunicorn app:app`)"""
+    if REFRESH_SCHEDULED and not (query_refresher_thread and query_refresher_thread.is_alive()):
+        ensure_query_refresher_running()
+
+@app.before_request
+def handle_preflight():
+    if request.method == "OPTIONS":
+        response = make_response()
+        response.headers.add("Access-Control-Allow-Origin", "*")
+        response.headers.add('Access-Control-Allow-Headers', "*")
+        response.headers.add('Access-Control-Allow-Methods', "*")
+        return response
+
+# ============================================================
+# Control de admisión: límite de concurrencia, rate limiting y debounce
+# ============================================================
+
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 8))
+MAX_QUEUED_REQUESTS = int(os.environ.get('MAX_QUEUED_REQUESTS', 32))
+ADMISSION_TIMEOUT_SECONDS = float(os.environ.get('ADMISSION_TIMEOUT_SECONDS', 10))
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', 5))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 20))
+FORCE_REFRESH_MIN_INTERVAL = float(os.environ.get('FORCE_REFRESH_MIN_INTERVAL', 30))
+# API keys con cuota propia (separadas por coma); cualquier otra key cuenta por IP
+RATE_LIMIT_API_KEYS = {key.strip() for key in os.environ.get('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()}
+
+# Métodos baratos (respuestas estáticas): nunca se encolan ni consumen cuota
+CHEAP_METHODS = {"ping", "initialize", "initialized", "notifications/initialized", "tools/list", "prompts/list", "resources/templates/list"}
+CHEAP_PATHS = {"/health", "/ready", "/mcp-info", "/endpoints"}
+# Costo en tokens de los endpoints que pueden disparar trabajo pesado
+ENDPOINT_COSTS = {"/force-refresh": 10, "/test-redash": 5, "/debug": 5, "/api/export": 10, "/api/refresh-status": 5}
+
+request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+admission_lock = threading.Lock()
+admission_stats = {"waiting": 0, "rejected_rate": 0, "rejected_overload": 0}
+rate_buckets = {}
+last_forced_refresh = 0.0
+
+def claim_forced_refresh():
+    """Reservar un refresco forzado: 0 si se permite, o segundos que faltan (debounce)"""
+    global last_forced_refresh
+    with admission_lock:
+        elapsed = time.time() - last_forced_refresh
+        if elapsed < FORCE_REFRESH_MIN_INTERVAL:
+            return round(FORCE_REFRESH_MIN_INTERVAL - elapsed, 1)
+        last_forced_refresh = time.time()
+    return 0
+
+def get_client_id():
+    """Identificar al cliente por API key configurada o, en su defecto, por IP"""
+    api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
+    if api_key and api_key in RATE_LIMIT_API_KEYS:
+        return f"key:{api_key}"
+    # remote_addr ya es la IP real con TRUSTED_PROXY_HOPS (ProxyFix); X-Forwarded-For
+    # sin validar lo controla el cliente y no sirve para la cuota
+    return f"ip:{request.remote_addr}"
+
+def take_rate_tokens(client_id, cost=1.0):
+    """Token bucket por cliente: True si hay cuota, False si debe rechazarse"""
+    now = time.time()
+    with admission_lock:
+        tokens, updated = rate_buckets.get(client_id, (RATE_LIMIT_BURST, now))
+        tokens = min(RATE_LIMIT_BURST, tokens + (now - updated) * RATE_LIMIT_PER_SECOND)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        rate_buckets[client_id] = (tokens, now)
+        # Olvidar clientes inactivos para que el mapa no crezca sin límite
+        if len(rate_buckets) > 10000:
+            idle = [cid for cid, (_, seen) in rate_buckets.items() if now - seen > 600]
+            for cid in idle:
+                del rate_buckets[cid]
+    return allowed
+
+def acquire_request_slot():
+    """Esperar un cupo de ejecución; False si la cola está llena o vence el timeout"""
+    with admission_lock:
+        if admission_stats["waiting"] >= MAX_QUEUED_REQUESTS:
+            return False
+        admission_stats["waiting"] += 1
+    try:
+        return request_slots.acquire(timeout=ADMISSION_TIMEOUT_SECONDS)
+    finally:
+        with admission_lock:
+            admission_stats["waiting"] -= 1
+
+def admission_error(code, message, status, retry_after, request_id=None):
+    """Respuesta de rechazo rápido (JSON-RPC en "/", JSON simple en REST)"""
+    if request.path == "/":
+        response = create_mcp_response({
             "jsonrpc": "2.0",
-            "error": {
-                "code": -32601,
-                "message": f"Method not found: {method}",
-                "data": {
-                    "supported_methods": [
-                        "initialize", "initialized", "tools/list", "tools/call",
-                        "resources/list", "prompts/list", "ping"
-                    ]
-                }
-            },
+            "error": {"code": code, "message": message, "data": {"retry_after": retry_after}},
             "id": request_id
-        })
+        }, status)
+    else:
+        response = create_mcp_response({"error": message, "retry_after": retry_after}, status)
+    response.headers['Retry-After'] = str(int(math.ceil(retry_after)))
+    return response
 
-def format_order_summary(order, index=None):
-    """Formatear orden para vista resumida"""
-    summary_parts = []
+@app.before_request
+def admission_control():
+    """Aplicar rate limiting por cliente y límite de concurrencia antes de cada petición"""
+    if request.method == "OPTIONS" or request.path in CHEAP_PATHS:
+        return None
     
-    # Buscar campos comunes de orden
-    order_fields = {
-        'order_number': ['order_number', 'order_id', 'number', 'id'],
-        'email': ['email', 'customer_email', 'user_email', 'client_email'],
-        'customer': ['customer', 'customer_name', 'client', 'client_name', 'name'],
-        'status': ['status', 'order_status', 'state'],
-        'total': ['total', 'amount', 'total_amount', 'price'],
-        'date': ['date', 'created_at', 'order_date', 'created']
-    }
+    request_id = None
+    if request.path == "/":
+        if request.method != "POST":
+            return None
+        rpc_request = request.get_json(silent=True)
+        if isinstance(rpc_request, dict):
+            request_id = rpc_request.get('id')
+            if rpc_request.get('method') in CHEAP_METHODS:
+                return None
     
-    found_fields = {}
-    for field_type, possible_names in order_fields.items():
-        for name in possible_names:
-            if name in order:
-                found_fields[field_type] = str(order[name])
-                break
+    # Nunca más que la ráfaga: con RATE_LIMIT_BURST bajo el endpoint seguiría siendo admisible
+    cost = min(ENDPOINT_COSTS.get(request.path, 1), RATE_LIMIT_BURST)
+    if not take_rate_tokens(get_client_id(), cost):
+        admission_stats["rejected_rate"] += 1
+        return admission_error(-32029, "Rate limit exceeded", 429, cost / RATE_LIMIT_PER_SECOND, request_id)
     
-    # Construir resumen
-    if 'order_number' in found_fields:
-        summary_parts.append(f"**Orden:** {found_fields['order_number']}")
+    if not acquire_request_slot():
+        admission_stats["rejected_overload"] += 1
+        return admission_error(-32000, "Server overloaded, try again later", 503, 1, request_id)
+    g.holds_request_slot = True
+    return None
+
+@app.teardown_request
+def release_request_slot(exc=None):
+    if g.pop('holds_request_slot', False):
+        request_slots.release()
+
+@app.route("/", methods=["GET", "POST", "DELETE", "OPTIONS"])
+def mcp_endpoint():
+    """Endpoint principal optimizado para Claude Desktop MCP"""
     
-    if 'email' in found_fields:
-        summary_parts.append(f"**Email:** {found_fields['email']}")
+    if request.method == "OPTIONS":
+        return create_mcp_response({})
     
-    if 'customer' in found_fields:
-        summary_parts.append(f"**Cliente:** {found_fields['customer']}")
+    if request.method == "DELETE":
+        session_id = request.headers.get('Mcp-Session-Id')
+        with sessions_lock:
+            removed = mcp_sessions.pop(session_id, None) if session_id else None
+        return create_mcp_response({"terminated": removed is not None}, 200 if removed else 404)
     
-    if 'status' in found_fields:
-        summary_parts.append(f"**Estado:** {found_fields['status']}")
+    if request.method == "GET" and 'text/event-stream' in request.headers.get('Accept', ''):
+        return open_sse_stream()
     
-    if 'total' in found_fields:
-        summary_parts.append(f"**Total:** {found_fields['total']}")
+    if request.method == "GET":
+        return create_mcp_response({
+            "name": "Redash Orders MCP Server",
+            "version": "1.0.0",
+            "description": "MCP server for Redash orders data - Claude Desktop compatible",
+            "protocol": "Model Context Protocol v2024-11-05",
+            "status": "running",
+            "auth_required": False,
+            "capabilities": {
+                "resources": {"subscribe": SUBSCRIPTIONS_ENABLED, "listChanged": True},
+                "tools": {"listChanged": False}
+            },
+            "transports": ["http-json", "streamable-http-sse"] if SUBSCRIPTIONS_ENABLED else ["http-json"],
+            "compatibility": {
+                "claude_desktop": True,
+                "protocol_version": "2024-11-05"
+            }
+        })
     
-    if 'date' in found_fields:
-        summary_parts.append(f"**Fecha:** {found_fields['date']}")
+    if request.method == "POST":
+        try:
+            if not request.is_json:
+                return create_mcp_response({
+                    "jsonrpc": "2.0",
+                    "error": {"code": -32700, "message": "Content must be JSON"},
+                    "id": None
+                }, 400)
+            
+            rpc_request = request.get_json()
+            if not rpc_request:
+                return create_mcp_response({
+                    "jsonrpc": "2.0",
+                    "error": {"code": -32700, "message": "Empty request body"},
+                    "id": None
+                }, 400)
+            
+            if not isinstance(rpc_request, dict) or 'method' not in rpc_request:
+                return create_mcp_response({
+                    "jsonrpc": "2.0",
+                    "error": {"code": -32600, "message": "Invalid JSON-RPC request"},
+                    "id": rpc_request.get('id')
+                }, 400)
+            
+            return handle_mcp_request(rpc_request)
+            
+        except Exception as e:
+            return create_mcp_response({
+                "jsonrpc": "2.0",
+                "error": {"code": -32603, "message": f"Internal error: {str(e)}"},
+                "id": None
+            }, 500)
+
+# ============================================================
+# Registro de métodos JSON-RPC y herramientas MCP
+# ============================================================
+
+MCP_METHODS = {}
+MCP_TOOLS = {}
+
+# Resultados estáticos serializados una sola vez (ver build_static_responses)
+STATIC_RESULTS = {}
+MCP_INFO_BODY = b""
+
+INITIALIZE_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "resources": {
+            "subscribe": SUBSCRIPTIONS_ENABLED,
+            "listChanged": True
+        },
+        "tools": {
+            "listChanged": False
+        }
+    },
+    "serverInfo": {
+        "name": "redash-orders-server",
+        "version": "1.0.0"
+    }
+}
+
+RESOURCE_TEMPLATES_RESULT = {
+    "resourceTemplates": [{
+        "uriTemplate": "orders://{order_number}",
+        "name": "Orden por número",
+        "description": "Orden individual del snapshot de Redash, en JSON",
+        "mimeType": "application/json"
+    }]
+}
+
+def mcp_method(name):
+    """Registrar un handler de método JSON-RPC: handler(params, request_id)"""
+    def decorator(func):
+        MCP_METHODS[name] = func
+        return func
+    return decorator
+
+def mcp_tool(name, description, input_schema):
+    """Registrar una herramienta MCP con su inputSchema y validador compilado"""
+    def decorator(func):
+        MCP_TOOLS[name] = {
+            "definition": {
+                "name": name,
+                "description": description,
+                "inputSchema": input_schema
+            },
+            "validate": compile_validator(input_schema),
+            "handler": func
+        }
+        return func
+    return decorator
+
+def compile_property_check(name, prop, required=False):
+    """Compilar la validación/coerción de una propiedad del inputSchema"""
+    prop_type = prop.get("type")
+    enum = set(prop["enum"]) if "enum" in prop else None
+    minimum = prop.get("minimum")
+    maximum = prop.get("maximum")
     
-    # Si no encontramos campos específicos, usar los primeros 3 campos
-    if not summary_parts:
-        items = list(order.items())[:3]
-        for key, value in items:
-            if value and str(value).strip():
-                safe_value = str(value)[:50] + ("..." if len(str(value)) > 50 else "")
-                summary_parts.append(f"**{key}:** {safe_value}")
+    def check_integer(value):
+        try:
+            if isinstance(value, bool):
+                raise TypeError(value)
+            value = int(value)
+        except (ValueError, TypeError):
+            # Opcional y no numérico: se usa el default, como hacían los handlers
+            return None, f"'{name}' must be an integer" if required else None
+        # Los rangos se ajustan (clamp) en vez de rechazarse, como hacían los handlers
+        if minimum is not None:
+            value = max(minimum, value)
+        if maximum is not None:
+            value = min(maximum, value)
+        return value, None
     
-    prefix = f"**{index}.** " if index else ""
-    return prefix + " • ".join(summary_parts) if summary_parts else f"{prefix}*Orden sin datos válidos*"
-
-def handle_list_orders(args, request_id):
-    """Listar órdenes con formato mejorado"""
-    print(f"🔧 list_orders called with args: {args}")
+    def check_boolean(value):
+        if isinstance(value, bool):
+            return value, None
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true", None
+        return None, f"'{name}' must be a boolean"
     
-    data = get_redash_data()
-    print(f"📊 get_redash_data returned: success={data.get('success')}, data_count={len(data.get('data', []))}")
+    def check_string(value):
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            return None, f"'{name}' must be a string"
+        value = str(value)
+        if enum is not None and value not in enum:
+            return None, f"'{name}' must be one of: {', '.join(sorted(enum))}"
+        return value, None
     
-    if not data.get("success"):
-        error_text = f"❌ **Error al obtener órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}\n\n"
-        
-        # Agregar información de debug si está disponible
-        if data.get('debug_info'):
-            error_text += f"*Información de debug:*\n```json\n{json.dumps(data.get('debug_info', {}), indent=2)}\n```\n\n"
+    def check_array(value):
+        if isinstance(value, str):
+            value = [item for item in value.split(',') if item.strip()]
+        if not isinstance(value, (list, tuple)):
+            return None, f"'{name}' must be an array"
+        return [str(item) for item in value], None
+    
+    checks = {
+        "integer": check_integer,
+        "boolean": check_boolean,
+        "string": check_string,
+        "array": check_array
+    }
+    return checks.get(prop_type, lambda value: (value, None))
+
+def compile_validator(schema):
+    """Compilar un validador de argumentos a partir de un inputSchema"""
+    properties = schema.get("properties", {})
+    required = tuple(schema.get("required", []))
+    allow_extra = schema.get("additionalProperties", True)
+    checks = [(name, compile_property_check(name, prop, name in required), prop.get("default"))
+              for name, prop in properties.items()]
+    
+    def validate(args):
+        if args is None:
+            args = {}
+        if not isinstance(args, dict):
+            return None, ["arguments must be an object"]
         
-        # Agregar sugerencias
-        error_text += "**Sugerencias:**\n"
-        error_text += "1. Verifica que el API de Redash esté funcionando\n"
-        error_text += "2. Comprueba la conectividad de red\n"
-        error_text += f"3. Visita `/test-redash` para diagnóstico directo\n"
-        error_text += f"4. Usa `/debug` para información detallada"
+        errors = [f"missing required argument: '{name}'" for name in required if args.get(name) is None]
+        if not allow_extra:
+            errors.extend(f"unknown argument: '{key}'" for key in args if key not in properties)
         
-        return create_mcp_response({
-            "jsonrpc": "2.0",
-            "result": {
-                "content": [{
-                    "type": "text",
-                    "text": error_text
-                }]
-            },
-            "id": request_id
-        })
+        clean_args = {}
+        for name, check, default in checks:
+            value = args.get(name)
+            if value is None:
+                if default is not None:
+                    clean_args[name] = default
+                continue
+            value, error = check(value)
+            if error:
+                errors.append(error)
+            elif value is not None:
+                clean_args[name] = value
+            elif default is not None:
+                clean_args[name] = default
+        return clean_args, errors
+    
+    return validate
+
+def serialize_static(data):
+    """Serializar a bytes JSON compactos"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def build_static_responses():
+    """Pre-serializar las respuestas que no cambian entre peticiones"""
+    global MCP_INFO_BODY
+    STATIC_RESULTS["initialize"] = serialize_static(INITIALIZE_RESULT)
+    STATIC_RESULTS["initialized"] = serialize_static({})
+    STATIC_RESULTS["tools/list"] = serialize_static({"tools": [tool["definition"] for tool in MCP_TOOLS.values()]})
+    STATIC_RESULTS["resources/templates/list"] = serialize_static(RESOURCE_TEMPLATES_RESULT)
+    STATIC_RESULTS["prompts/list"] = serialize_static({"prompts": []})
+    MCP_INFO_BODY = serialize_static({
+        "server_type": "MCP Server",
+        "protocol_version": "2024-11-05",
+        "capabilities": ["tools", "resources", "prompts"],
+        "tools_available": list(MCP_TOOLS),
+        "claude_desktop_compatible": True,
+        "status": "operational"
+    })
+    print(f"⚡ Pre-serialized {len(STATIC_RESULTS)} static responses for {len(MCP_TOOLS)} tools")
+
+def with_request_id(body, request_id):
+    """Insertar el id JSON-RPC en un cuerpo serializado con "id": null"""
+    prefix = b'{"id":null,'
+    if body.startswith(prefix):
+        return b'{"id":' + serialize_static(request_id) + b',' + body[len(prefix):]
+    message = json.loads(body)
+    message["id"] = request_id
+    return serialize_static(message)
+
+def coalesced_endpoint(func):
+    """Compartir la respuesta de un endpoint REST entre peticiones idénticas concurrentes"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = ("rest", request.path, tuple(sorted(request.args.items(multi=True))))
+        shared = coalesce(key, lambda: make_response(func(*args, **kwargs)))
+        response = Response(shared.get_data(), shared.status_code)
+        response.headers.update(dict(shared.headers))
+        return response
+    return wrapper
+
+def create_static_response(method, request_id):
+    """Respuesta JSON-RPC con un resultado pre-serializado"""
+    body = b'{"jsonrpc":"2.0","id":' + serialize_static(request_id) + b',"result":' + STATIC_RESULTS[method] + b'}'
+    return create_raw_response(body)
+
+def handle_mcp_request(rpc_request):
+    """Manejar peticiones JSON-RPC del protocolo MCP (despacho por tabla)"""
+    method = rpc_request.get('method')
+    params = rpc_request.get('params') or {}
+    request_id = rpc_request.get('id')
+    
+    handler = MCP_METHODS.get(method)
+    if handler is None and 'id' not in rpc_request and str(method).startswith("notifications/"):
+        # Notificación desconocida: se acepta sin respuesta
+        return create_raw_response(b"", 202)
+    if handler is None:
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "error": {
+                "code": -32601,
+                "message": f"Method not found: {method}",
+                "data": {"supported_methods": list(MCP_METHODS)}
+            },
+            "id": request_id
+        })
+    return handler(params, request_id)
+
+@mcp_method("initialize")
+def rpc_initialize(params, request_id):
+    response = create_static_response("initialize", request_id)
+    if SUBSCRIPTIONS_ENABLED:
+        response.headers['Mcp-Session-Id'] = create_session()
+    return response
+
+@mcp_method("initialized")
+def rpc_initialized(params, request_id):
+    return create_static_response("initialized", request_id)
+
+@mcp_method("notifications/initialized")
+def rpc_notifications_initialized(params, request_id):
+    # Notificación JSON-RPC: 202 sin cuerpo (transporte streamable HTTP)
+    return create_raw_response(b"", 202)
+
+@mcp_method("tools/list")
+def rpc_tools_list(params, request_id):
+    return create_static_response("tools/list", request_id)
+
+@mcp_method("tools/call")
+def rpc_tools_call(params, request_id):
+    tool_name = params.get("name")
+    tool = MCP_TOOLS.get(tool_name)
+    if tool is None:
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "error": {
+                "code": -32601,
+                "message": f"Unknown tool: {tool_name}",
+                "data": {"available_tools": list(MCP_TOOLS)}
+            },
+            "id": request_id
+        })
+    
+    args, errors = tool["validate"](params.get("arguments"))
+    if errors:
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "error": {
+                "code": -32602,
+                "message": f"Invalid arguments for {tool_name}",
+                "data": {"errors": errors}
+            },
+            "id": request_id
+        })
+    # Llamadas idénticas concurrentes comparten el cálculo y el cuerpo de la respuesta
+    key = ("tools/call", tool_name, json.dumps(args, sort_keys=True, default=str))
+    shared = coalesce(key, lambda: tool["handler"](args, None))
+    return create_raw_response(with_request_id(shared.get_data(), request_id), shared.status_code)
+
+@mcp_method("resources/templates/list")
+def rpc_resource_templates_list(params, request_id):
+    return create_static_response("resources/templates/list", request_id)
+
+@mcp_method("resources/subscribe")
+def rpc_resources_subscribe(params, request_id):
+    return handle_resource_subscription(params, request_id, subscribe=True)
+
+@mcp_method("resources/unsubscribe")
+def rpc_resources_unsubscribe(params, request_id):
+    return handle_resource_subscription(params, request_id, subscribe=False)
+
+@mcp_method("prompts/list")
+def rpc_prompts_list(params, request_id):
+    return create_static_response("prompts/list", request_id)
+
+@mcp_method("ping")
+def rpc_ping(params, request_id):
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {"status": "pong", "timestamp": datetime.now().isoformat()},
+        "id": request_id
+    })
+
+def format_value(value):
+    """Representar un valor tipado como texto legible"""
+    if value is None:
+        return "N/A"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def compact_value(value):
+    """Representar un valor en una celda TSV (sin tabs ni saltos de línea)"""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    text = str(value)
+    if '\t' in text or '\n' in text or '\r' in text:
+        text = text.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+    return text
+
+def parse_fields_arg(fields):
+    """Normalizar el argumento 'fields' (lista o texto separado por comas)"""
+    if not fields:
+        return []
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    if not isinstance(fields, (list, tuple)):
+        return []
+    return [normalize_column_name(f) for f in fields if str(f).strip()]
+
+def resolve_projection(fields, columns, field_map=None):
+    """Resolver columnas proyectadas: (columnas válidas, columnas desconocidas)"""
+    if not fields:
+        # Por defecto, una columna por cada campo del resumen
+        field_map = field_map or resolve_field_map(columns)
+        projected = list(field_map["fields"].values())
+        return (projected or list(columns)[:6]), []
+    available = set(columns)
+    return [f for f in fields if f in available], [f for f in fields if f not in available]
+
+def render_compact_table(orders, projected, total_count=None):
+    """Renderizar órdenes como TSV con fila de encabezado"""
+    lines = []
+    if total_count is not None:
+        lines.append(f"# rows={len(orders)} total={total_count}")
+    lines.append("\t".join(projected))
+    for order in orders:
+        if isinstance(order, dict):
+            lines.append("\t".join(compact_value(order.get(col)) for col in projected))
+    return "\n".join(lines)
+
+def format_order_summary(order, index=None, fields=None):
+    """Formatear orden para vista resumida (fields: mapa campo lógico → columna del snapshot)"""
+    summary_parts = []
+    
+    if fields is None:
+        fields = resolve_field_map(order.keys())["fields"]
+    
+    found_fields = {}
+    for field_type, column in fields.items():
+        value = order.get(column)
+        if value is not None:
+            found_fields[field_type] = format_value(value)
+    
+    # Construir resumen
+    if 'order_number' in found_fields:
+        summary_parts.append(f"**Orden:** {found_fields['order_number']}")
+    
+    if 'email' in found_fields:
+        summary_parts.append(f"**Email:** {found_fields['email']}")
+    
+    if 'customer' in found_fields:
+        summary_parts.append(f"**Cliente:** {found_fields['customer']}")
+    
+    if 'status' in found_fields:
+        summary_parts.append(f"**Estado:** {found_fields['status']}")
+    
+    if 'total' in found_fields:
+        summary_parts.append(f"**Total:** {found_fields['total']}")
+    
+    if 'date' in found_fields:
+        summary_parts.append(f"**Fecha:** {found_fields['date']}")
+    
+    # Si no encontramos campos específicos, usar los primeros 3 campos
+    if not summary_parts:
+        items = list(order.items())[:3]
+        for key, value in items:
+            if value is not None and str(value).strip():
+                text_value = format_value(value)
+                safe_value = text_value[:50] + ("..." if len(text_value) > 50 else "")
+                summary_parts.append(f"**{key}:** {safe_value}")
+    
+    prefix = f"**{index}.** " if index else ""
+    return prefix + " • ".join(summary_parts) if summary_parts else f"{prefix}*Orden sin datos válidos*"
+
+@mcp_tool(
+    name="list_orders",
+    description="Retrieve all orders from Redash database with optional limit and format options.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of orders to return (default: 20, max: 100)",
+                "default": 20,
+                "minimum": 1,
+                "maximum": 100
+            },
+            "format": {
+                "type": "string",
+                "enum": [
+                    "summary",
+                    "detailed",
+                    "json",
+                    "compact"
+                ],
+                "description": "Output format - summary: key fields only, detailed: all fields, json: raw data, compact: tab-separated table with a header row (fewest tokens)",
+                "default": "summary"
+            },
+            "fields": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "Columns to include in compact/json output (default: key summary fields)"
+            }
+        },
+        "additionalProperties": False
+    }
+)
+def handle_list_orders(args, request_id):
+    """Listar órdenes con formato mejorado"""
+    print(f"🔧 list_orders called with args: {args}")
+    
+    data = get_redash_data()
+    print(f"📊 get_redash_data returned: success={data.get('success')}, data_count={len(data.get('data', []))}")
+    
+    if not data.get("success"):
+        error_text = f"❌ **Error al obtener órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}\n\n"
+        
+        # Agregar información de debug si está disponible
+        if data.get('debug_info'):
+            error_text += f"*Información de debug:*\n```json\n{json.dumps(data.get('debug_info', {}), indent=2)}\n```\n\n"
+        
+        # Agregar sugerencias
+        error_text += "**Sugerencias:**\n"
+        error_text += "1. Verifica que el API de Redash esté funcionando\n"
+        error_text += "2. Comprueba la conectividad de red\n"
+        error_text += f"3. Visita `/test-redash` para diagnóstico directo\n"
+        error_text += f"4. Usa `/debug` para información detallada"
+        
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": error_text
+                }]
+            },
+            "id": request_id
+        })
     
     orders = data.get("data", [])
+    summary_fields = get_field_map(data)["fields"]
     print(f"📋 Processing {len(orders)} orders")
     
     # Validar argumentos
@@ -586,17 +2568,30 @@ def handle_list_orders(args, request_id):
         limit = 20
     
     format_type = args.get("format", "summary")
-    if format_type not in ["summary", "detailed", "json"]:
+    if format_type not in ["summary", "detailed", "json", "compact"]:
         format_type = "summary"
+    fields = parse_fields_arg(args.get("fields"))
     
-    print(f"🔧 Using limit={limit}, format={format_type}")
+    print(f"🔧 Using limit={limit}, format={format_type}, fields={fields}")
     
     # Aplicar límite
     limited_orders = orders[:limit] if orders else []
     
     try:
-        if format_type == "json":
-            json_str = json.dumps(limited_orders, indent=2, ensure_ascii=False, default=str)
+        if format_type == "compact":
+            projected, unknown = resolve_projection(fields, data.get("metadata", {}).get("columns", []), get_field_map(data))
+            if fields and not projected:
+                result_text = f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(data.get('metadata', {}).get('columns', []))}"
+            else:
+                result_text = render_compact_table(limited_orders, projected, len(orders))
+                if unknown:
+                    result_text += f"\n# unknown fields ignored: {', '.join(unknown)}"
+        
+        elif format_type == "json":
+            if fields:
+                projected, _ = resolve_projection(fields, data.get("metadata", {}).get("columns", []), get_field_map(data))
+                limited_orders = [{col: order.get(col) for col in projected} for order in limited_orders if isinstance(order, dict)]
+            json_str = json.dumps(limited_orders, indent=2, ensure_ascii=False, default=json_default)
             result_text = f"📊 **Órdenes en formato JSON**\n\n**Registros devueltos:** {len(limited_orders)} de {len(orders)} totales\n\n```json\n{json_str}\n```"
         
         elif format_type == "detailed":
@@ -618,7 +2613,7 @@ def handle_list_orders(args, request_id):
                     result_text += f"### 📦 Orden #{i}\n"
                     for key, value in order.items():
                         safe_key = str(key) if key is not None else "campo_desconocido"
-                        safe_value = str(value) if value is not None else "N/A"
+                        safe_value = format_value(value)
                         result_text += f"- **{safe_key}:** {safe_value}\n"
                     result_text += "\n"
         
@@ -628,7 +2623,7 @@ def handle_list_orders(args, request_id):
             if limited_orders:
                 for i, order in enumerate(limited_orders, 1):
                     if isinstance(order, dict):
-                        result_text += format_order_summary(order, i) + "\n"
+                        result_text += format_order_summary(order, i, summary_fields) + "\n"
             else:
                 result_text += "*No se encontraron órdenes.*\n\n"
                 
@@ -674,124 +2669,1285 @@ def handle_list_orders(args, request_id):
         "id": request_id
     })
 
-def handle_search_by_order_number(args, request_id):
-    """Buscar órdenes por número de orden"""
-    try:
-        order_number = str(args.get("order_number", "")).strip()
-        exact_match = bool(args.get("exact_match", False))
-        limit = int(args.get("limit", 10))
-        limit = max(1, min(limit, 50))
-    except (ValueError, TypeError):
-        limit = 10
-        exact_match = False
-        order_number = ""
+@mcp_tool(
+    name="search_orders_by_number",
+    description="Search for orders by order number. Supports exact match, partial search and typo-tolerant fuzzy search.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "order_number": {
+                "type": "string",
+                "description": "Order number to search for (can be partial)"
+            },
+            "exact_match": {
+                "type": "boolean",
+                "description": "Whether to use exact match (true) or partial search (false)",
+                "default": False
+            },
+            "fuzzy": {
+                "type": "boolean",
+                "description": "Typo-tolerant search ranked by similarity (overrides exact_match)",
+                "default": False
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum results to return",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 50
+            },
+            "format": {
+                "type": "string",
+                "enum": [
+                    "summary",
+                    "compact"
+                ],
+                "description": "Output format - summary: Markdown list, compact: tab-separated table with a header row",
+                "default": "summary"
+            },
+            "fields": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "Columns to include in compact output (default: key summary fields)"
+            }
+        },
+        "required": [
+            "order_number"
+        ],
+        "additionalProperties": False
+    }
+)
+def handle_search_by_order_number(args, request_id):
+    """Buscar órdenes por número de orden"""
+    try:
+        order_number = str(args.get("order_number", "")).strip()
+        exact_match = bool(args.get("exact_match", False))
+        limit = int(args.get("limit", 10))
+        limit = max(1, min(limit, 50))
+    except (ValueError, TypeError):
+        limit = 10
+        exact_match = False
+        order_number = ""
+    format_type = "compact" if args.get("format") == "compact" else "summary"
+    fields = parse_fields_arg(args.get("fields"))
+    fuzzy = args.get("fuzzy") in (True, "true", "True")
+    
+    if not order_number:
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": "❌ **Número de orden requerido**\n\nPor favor proporciona un número de orden para buscar."
+                }]
+            },
+            "id": request_id
+        })
+    
+    data = get_redash_data()
+    if not data.get("success"):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ **Error al buscar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
+                }]
+            },
+            "id": request_id
+        })
+    
+    orders = data.get("data", [])
+    matching_orders = []
+    
+    # Columnas de número de orden resueltas en el refresh
+    field_map = get_field_map(data)
+    order_number_fields = field_map["key_columns"]
+    summary_fields = field_map["fields"]
+    
+    try:
+        similarities = {}
+        if fuzzy:
+            for order, similarity in fuzzy_matching_orders("order_number", order_number, limit):
+                matching_orders.append(order)
+                similarities[id(order)] = similarity
+        else:
+            search_term = order_number.lower()
+            for order in orders:
+                if not isinstance(order, dict):
+                    continue
+                
+                found_match = False
+                for field in order_number_fields:
+                    value = order.get(field)
+                    if value is not None:
+                        field_value = str(value).lower()
+                    
+                        if exact_match:
+                            if field_value == search_term:
+                                matching_orders.append(order)
+                                found_match = True
+                                break
+                        else:
+                            if search_term in field_value:
+                                matching_orders.append(order)
+                                found_match = True
+                                break
+            
+                if found_match and len(matching_orders) >= limit:
+                    break
+        
+        if format_type == "compact":
+            projected, _ = resolve_projection(fields, data.get("metadata", {}).get("columns", []), get_field_map(data))
+            rows = matching_orders[:limit]
+            if fuzzy:
+                rows = [dict(order, similarity=round(similarities[id(order)], 3)) for order in rows]
+                projected = projected + ["similarity"]
+            result_text = render_compact_table(rows, projected)
+        else:
+            match_type = "difusa" if fuzzy else ("exacta" if exact_match else "parcial")
+            result_text = f"🔍 **Búsqueda por Número de Orden**\n\n"
+            result_text += f"**Término:** `{order_number}` (búsqueda {match_type})\n"
+            result_text += f"**Encontradas:** {len(matching_orders)} órdenes\n\n"
+        
+            if matching_orders:
+                for i, order in enumerate(matching_orders[:limit], 1):
+                    result_text += format_order_summary(order, i, summary_fields)
+                    if fuzzy:
+                        result_text += f" • *similitud {similarities[id(order)]:.2f}*"
+                    result_text += "\n"
+                
+                if len(matching_orders) > limit:
+                    result_text += f"\n*... y {len(matching_orders) - limit} órdenes más*\n"
+            else:
+                result_text += f"*No se encontraron órdenes con el número '{order_number}'.*\n"
+                result_text += fuzzy_suggestions_text("order_number", order_number)
+                result_text += f"\n**Sugerencia:** Intenta con búsqueda parcial (exact_match: false), búsqueda difusa (fuzzy: true) o verifica el número de orden."
+    
+    except Exception as e:
+        result_text = f"🔍 **Error en Búsqueda**\n\n**Término:** `{order_number}`\n**Error:** {str(e)}"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+@mcp_tool(
+    name="search_orders_by_email",
+    description="Search for orders by customer email address. Supports exact match, partial search and typo-tolerant fuzzy search.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "Email address to search for (can be partial)"
+            },
+            "exact_match": {
+                "type": "boolean",
+                "description": "Whether to use exact match (true) or partial search (false)",
+                "default": False
+            },
+            "fuzzy": {
+                "type": "boolean",
+                "description": "Typo-tolerant search ranked by similarity (overrides exact_match)",
+                "default": False
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum results to return",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 50
+            },
+            "format": {
+                "type": "string",
+                "enum": [
+                    "summary",
+                    "compact"
+                ],
+                "description": "Output format - summary: Markdown list, compact: tab-separated table with a header row",
+                "default": "summary"
+            },
+            "fields": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "Columns to include in compact output (default: key summary fields)"
+            }
+        },
+        "required": [
+            "email"
+        ],
+        "additionalProperties": False
+    }
+)
+def handle_search_by_email(args, request_id):
+    """Buscar órdenes por email del cliente"""
+    try:
+        email = str(args.get("email", "")).strip().lower()
+        exact_match = bool(args.get("exact_match", False))
+        limit = int(args.get("limit", 10))
+        limit = max(1, min(limit, 50))
+    except (ValueError, TypeError):
+        limit = 10
+        exact_match = False
+        email = ""
+    format_type = "compact" if args.get("format") == "compact" else "summary"
+    fields = parse_fields_arg(args.get("fields"))
+    fuzzy = args.get("fuzzy") in (True, "true", "True")
+    
+    if not email:
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": "❌ **Email requerido**\n\nPor favor proporciona un email para buscar órdenes."
+                }]
+            },
+            "id": request_id
+        })
+    
+    data = get_redash_data()
+    if not data.get("success"):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ **Error al buscar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
+                }]
+            },
+            "id": request_id
+        })
+    
+    orders = data.get("data", [])
+    matching_orders = []
+    
+    # Columnas de email resueltas en el refresh
+    field_map = get_field_map(data)
+    email_fields = field_map["email_columns"]
+    summary_fields = field_map["fields"]
+    
+    try:
+        similarities = {}
+        if fuzzy:
+            for order, similarity in fuzzy_matching_orders("email", email, limit):
+                matching_orders.append(order)
+                similarities[id(order)] = similarity
+        else:
+            for order in orders:
+                if not isinstance(order, dict):
+                    continue
+                
+                found_match = False
+                for field in email_fields:
+                    value = order.get(field)
+                    if value is not None:
+                        field_value = str(value).lower().strip()
+                    
+                        if exact_match:
+                            if field_value == email:
+                                matching_orders.append(order)
+                                found_match = True
+                                break
+                        else:
+                            if email in field_value:
+                                matching_orders.append(order)
+                                found_match = True
+                                break
+            
+                if found_match and len(matching_orders) >= limit:
+                    break
+        
+        if format_type == "compact":
+            projected, _ = resolve_projection(fields, data.get("metadata", {}).get("columns", []), get_field_map(data))
+            rows = matching_orders[:limit]
+            if fuzzy:
+                rows = [dict(order, similarity=round(similarities[id(order)], 3)) for order in rows]
+                projected = projected + ["similarity"]
+            result_text = render_compact_table(rows, projected)
+        else:
+            match_type = "difusa" if fuzzy else ("exacta" if exact_match else "parcial")
+            result_text = f"📧 **Búsqueda por Email**\n\n"
+            result_text += f"**Email:** `{args.get('email')}` (búsqueda {match_type})\n"
+            result_text += f"**Encontradas:** {len(matching_orders)} órdenes\n\n"
+        
+            if matching_orders:
+                for i, order in enumerate(matching_orders[:limit], 1):
+                    result_text += format_order_summary(order, i, summary_fields)
+                    if fuzzy:
+                        result_text += f" • *similitud {similarities[id(order)]:.2f}*"
+                    result_text += "\n"
+                
+                if len(matching_orders) > limit:
+                    result_text += f"\n*... y {len(matching_orders) - limit} órdenes más*\n"
+            else:
+                result_text += f"*No se encontraron órdenes para el email '{args.get('email')}'.*\n"
+                result_text += fuzzy_suggestions_text("email", email)
+                result_text += f"\n**Sugerencia:** Intenta con búsqueda parcial (exact_match: false), búsqueda difusa (fuzzy: true) o verifica el email."
+    
+    except Exception as e:
+        result_text = f"📧 **Error en Búsqueda**\n\n**Email:** `{args.get('email')}`\n**Error:** {str(e)}"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+@mcp_tool(
+    name="search_orders",
+    description="Full-text search across all text fields of the orders (customer, address, products, email, status...). Accent-insensitive, results ranked by relevance.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Free text to search for (e.g. customer name, street, product)"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum results to return",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 50
+            },
+            "format": {
+                "type": "string",
+                "enum": ["summary", "compact"],
+                "description": "Output format - summary: Markdown list, compact: tab-separated table with a header row",
+                "default": "summary"
+            },
+            "fields": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Columns to include in compact output (default: key summary fields)"
+            }
+        },
+        "required": ["query"],
+        "additionalProperties": False
+    }
+)
+def handle_search_orders(args, request_id):
+    """Búsqueda de texto completo sobre todas las columnas de texto"""
+    query = str(args.get("query", "")).strip()
+    try:
+        limit = max(1, min(int(args.get("limit", 10)), 50))
+    except (ValueError, TypeError):
+        limit = 10
+    format_type = "compact" if args.get("format") == "compact" else "summary"
+    fields = parse_fields_arg(args.get("fields"))
+    
+    if not tokenize(query):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": "❌ **Texto de búsqueda requerido**\n\nPor favor proporciona palabras para buscar (nombre, dirección, producto...)."
+                }]
+            },
+            "id": request_id
+        })
+    
+    data = get_redash_data()
+    if not data.get("success"):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ **Error al buscar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
+                }]
+            },
+            "id": request_id
+        })
+    
+    try:
+        field_map = get_field_map(data)
+        results = text_search(query, limit)
+        
+        if format_type == "compact":
+            projected, _ = resolve_projection(fields, data.get("metadata", {}).get("columns", []), field_map)
+            rows = [dict(order, score=round(score, 3)) for order, score in results]
+            result_text = render_compact_table(rows, projected + ["score"])
+        else:
+            result_text = f"🔎 **Búsqueda de Texto**\n\n"
+            result_text += f"**Consulta:** `{query}`\n"
+            result_text += f"**Encontradas:** {len(results)} órdenes\n\n"
+            
+            if results:
+                for i, (order, score) in enumerate(results, 1):
+                    result_text += format_order_summary(order, i, field_map["fields"]) + f" • *relevancia {score:.2f}*\n"
+            else:
+                result_text += f"*No se encontraron órdenes para '{query}'.*\n"
+                result_text += f"\n**Sugerencia:** Prueba con menos palabras o con otros términos."
+    
+    except Exception as e:
+        result_text = f"🔎 **Error en Búsqueda**\n\n**Consulta:** `{query}`\n**Error:** {str(e)}"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+@mcp_tool(
+    name="get_orders_stats",
+    description="Get statistical overview and metadata about the orders database.",
+    input_schema={
+        "type": "object",
+        "properties": {},
+        "additionalProperties": False
+    }
+)
+def handle_get_orders_stats(args, request_id):
+    """Obtener estadísticas de las órdenes"""
+    data = get_redash_data()
+    
+    if not data.get("success"):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": f"❌ **Error al obtener estadísticas**\n\n**Error:** {data.get('error', 'Error desconocido')}"
+                }]
+            },
+            "id": request_id
+        })
+    
+    orders = data.get("data", [])
+    metadata = data.get("metadata", {})
+    
+    try:
+        result_text = f"📈 **Estadísticas de la Base de Datos de Órdenes**\n\n"
+        result_text += f"**📊 Total de Registros:** {len(orders):,}\n"
+        
+        columns = metadata.get("columns", [])
+        result_text += f"**🏷️ Total de Columnas:** {len(columns)}\n"
+        result_text += f"**🔗 Fuente de Datos:** {metadata.get('source', 'Desconocida')}\n"
+        result_text += f"**⏰ Última Actualización:** {metadata.get('retrieved_at', 'Desconocida')}\n"
+        
+        if metadata.get('data_cleaned'):
+            result_text += f"**✅ Estado de Datos:** Limpiados y validados\n"
+        
+        result_text += "\n"
+        
+        schema = metadata.get("schema", {})
+        if columns:
+            result_text += "**📋 Columnas Disponibles:**\n"
+            for i, col in enumerate(columns[:20], 1):
+                safe_col = str(col) if col is not None else f"columna_{i}"
+                col_type = schema.get(col)
+                result_text += f"{i}. `{safe_col}`" + (f" *({col_type})*" if col_type else "") + "\n"
+            
+            if len(columns) > 20:
+                result_text += f"*... y {len(columns) - 20} columnas más*\n"
+        
+        # Campos lógicos resueltos en el refresh
+        field_map = get_field_map(data)
+        mapped_fields = field_map["fields"]
+        if mapped_fields:
+            result_text += f"\n**🧭 Campos Identificados:**\n"
+            for field_type, column in mapped_fields.items():
+                result_text += f"- **{field_type}** → `{column}`\n"
+        
+        status_column = mapped_fields.get("status")
+        if status_column and orders:
+            status_counts = {}
+            for order in orders:
+                if isinstance(order, dict):
+                    status = order.get(status_column)
+                    status_counts[status] = status_counts.get(status, 0) + 1
+            result_text += f"\n**📦 Órdenes por Estado:**\n"
+            for status, count in sorted(status_counts.items(), key=lambda item: -item[1])[:10]:
+                result_text += f"- **{format_value(status)}:** {count:,}\n"
+        
+        # Agregados numéricos calculados directamente sobre los valores tipados
+        numeric_columns = [col for col, col_type in schema.items() if col_type in ('integer', 'float', 'decimal')]
+        if numeric_columns and orders:
+            result_text += f"\n**🔢 Columnas Numéricas:**\n"
+            for col in numeric_columns[:10]:
+                values = [order[col] for order in orders if isinstance(order, dict) and isinstance(order.get(col), (int, float, Decimal))]
+                if not values:
+                    continue
+                total = sum(values)
+                result_text += f"- **{col}:** mín {min(values)} • máx {max(values)} • suma {total} • promedio {total / len(values):.2f}\n"
+        
+        if orders and isinstance(orders[0], dict):
+            result_text += f"\n**🔍 Vista Previa de Datos:**\n"
+            sample_order = orders[0]
+            sample_items = list(sample_order.items())[:5]
+            
+            for key, value in sample_items:
+                safe_key = str(key) if key is not None else "desconocido"
+                safe_value = format_value(value)
+                value_type = type(value).__name__
+                
+                if len(safe_value) > 100:
+                    safe_value = safe_value[:97] + "..."
+                
+                result_text += f"- **{safe_key}:** `{safe_value}` *({value_type})*\n"
+            
+            if len(sample_order) > 5:
+                result_text += f"*... y {len(sample_order) - 5} campos más por registro*\n"
+    
+    except Exception as e:
+        result_text = f"📈 **Estadísticas de Órdenes**\n\n**Registros:** {len(orders)}\n**Estado:** Datos disponibles pero falló la generación de estadísticas\n**Error:** {str(e)}"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+def format_timestamp(timestamp):
+    """Timestamp → ISO 8601 local, o '—' si no hay valor"""
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else "—"
+
+@mcp_tool(
+    name="get_refresh_status",
+    description="Report whether a Redash query re-execution is in progress, its job state and the refresh schedule. Optionally trigger a re-execution without waiting for it.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "trigger": {
+                "type": "boolean",
+                "description": "Start a Redash re-execution in the background (returns immediately)",
+                "default": False
+            }
+        },
+        "additionalProperties": False
+    }
+)
+def handle_get_refresh_status(args, request_id):
+    """Informar el estado de la re-ejecución de la query (y opcionalmente iniciarla)"""
+    result_text = f"🛰️ **Actualización de Datos (Redash Query {REDASH_QUERY_ID})**\n\n"
+    if args.get("trigger"):
+        started, reason, retry_after = trigger_query_refresh("tool")
+        if started:
+            result_text += "✅ Re-ejecución iniciada en segundo plano. Consulta de nuevo para ver su avance.\n\n"
+        elif reason == "debounced":
+            result_text += f"⏳ Se actualizó hace poco; podrás pedir otra re-ejecución en {retry_after:.0f} s.\n\n"
+        else:
+            result_text += "⏳ Ya hay una actualización en curso.\n\n"
+    
+    with query_refresh_lock:
+        state = dict(query_refresh_state, jobs=dict(query_refresh_state["jobs"]))
+    
+    in_progress = state["status"] in ACTIVE_REFRESH_STATES
+    result_text += f"**Estado:** {state['status']}{' (en curso)' if in_progress else ''}\n"
+    if state["trigger"]:
+        result_text += f"**Origen:** {state['trigger']}\n"
+    result_text += f"**Inicio:** {format_timestamp(state['started_at'])}\n"
+    result_text += f"**Fin:** {format_timestamp(state['finished_at'])}\n"
+    for index, job in sorted(state["jobs"].items()):
+        result_text += f"- Job `{job['id']}`: {job['status']}\n"
+    if state["error"]:
+        result_text += f"**Error:** {state['error']}\n"
+    
+    schedule = []
+    if REDASH_REFRESH_INTERVAL > 0:
+        schedule.append(f"cada {REDASH_REFRESH_INTERVAL} s")
+    if REFRESH_SCHEDULE_TIMES:
+        schedule.append("a las " + ", ".join(f"{hour:02d}:{minute:02d}" for hour, minute in REFRESH_SCHEDULE_TIMES))
+    result_text += f"\n**Agenda:** {' y '.join(schedule) if schedule else 'sin re-ejecución programada'}\n"
+    result_text += f"**Próxima ejecución:** {format_timestamp(state['next_run_at'])}\n"
+    
+    snapshot = get_snapshot()
+    records = len(snapshot.result["data"]) if snapshot.result else 0
+    age = f"{time.time() - snapshot.retrieved_at:.0f} s" if snapshot.retrieved_at else "—"
+    result_text += f"**Datos en cache:** {records:,} registros • antigüedad {age}\n"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+@mcp_tool(
+    name="orders_changes",
+    description="Orders inserted, updated or deleted since a snapshot version (or timestamp), computed from row hashes kept for recent refreshes. Lets clients sync incrementally instead of re-listing all orders.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "since_version": {
+                "type": "string",
+                "description": "Snapshot version the client already has (from a previous call); default: the previous refresh"
+            },
+            "since": {
+                "type": "string",
+                "description": "ISO timestamp; changes in snapshots retrieved after it (used when since_version is not given)"
+            },
+            "include_rows": {
+                "type": "boolean",
+                "description": "Include the current rows of inserted and updated orders",
+                "default": False
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of keys (and rows) listed per change type",
+                "default": 100,
+                "minimum": 1,
+                "maximum": 1000
+            },
+            "format": {
+                "type": "string",
+                "enum": [
+                    "summary",
+                    "json"
+                ],
+                "description": "Output format - summary: Markdown, json: machine-readable object for syncing",
+                "default": "summary"
+            }
+        },
+        "additionalProperties": False
+    }
+)
+def handle_orders_changes(args, request_id):
+    """Cambios de órdenes desde una versión del snapshot, comparando hashes de filas"""
+    data = get_redash_data()
+    
+    def text_response(text):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "result": {
+                "content": [{
+                    "type": "text",
+                    "text": text
+                }]
+            },
+            "id": request_id
+        })
+    
+    if not data.get("success"):
+        return text_response(f"❌ **Error al obtener cambios**\n\n**Error:** {data.get('error', 'Error desconocido')}")
+    
+    since = None
+    if args.get("since") and not args.get("since_version"):
+        try:
+            since = parse_datetime(str(args["since"])).timestamp()
+        except ValueError:
+            return text_response(f"❌ **Fecha inválida:** `{args.get('since')}` (usa formato ISO, p. ej. 2026-01-31T08:00)")
+    limit = max(1, min(int(args.get("limit") or 100), 1000))
+    snapshot = get_snapshot()
+    changes = changes_since(snapshot.history, args.get("since_version"), since)
+    current_version = snapshot_version(data)
+    
+    if changes is None:
+        # La base es más antigua que el historial retenido: hay que volver a listar
+        oldest = snapshot.history[0] if snapshot.history else None
+        if args.get("format") == "json":
+            return text_response(json.dumps({
+                "current_version": current_version,
+                "resync_required": True,
+                "oldest_version": oldest["version"] if oldest else None
+            }))
+        return text_response(
+            "⚠️ **Resincronización necesaria**\n\n"
+            f"La versión o fecha pedida ya no está en el historial ({len(snapshot.history)} versiones retenidas"
+            f"{', la más antigua de ' + format_timestamp(oldest['retrieved_at']) if oldest else ''}).\n"
+            f"Vuelve a listar las órdenes; la versión actual es `{current_version}`.")
+    
+    rows = {}
+    if args.get("include_rows"):
+        for key in changes["inserted"][:limit] + changes["updated"][:limit]:
+            found = snapshot.order_index.get(key)
+            if found:
+                rows[key] = found[0] if len(found) == 1 else found
+    
+    if args.get("format") == "json":
+        payload = {
+            "current_version": changes["current_version"],
+            "base_version": changes["base_version"],
+            "resync_required": False,
+            "counts": {kind: len(changes[kind]) for kind in ("inserted", "updated", "deleted")},
+            "truncated": any(len(changes[kind]) > limit for kind in ("inserted", "updated", "deleted"))
+        }
+        for kind in ("inserted", "updated", "deleted"):
+            payload[kind] = changes[kind][:limit]
+        if args.get("include_rows"):
+            payload["rows"] = rows
+        return text_response(json.dumps(payload, ensure_ascii=False, default=json_default))
+    
+    fields = get_field_map(data)["fields"]
+    result_text = f"🔄 **Cambios en órdenes** (versión `{changes['base_version']}` → `{changes['current_version']}`)\n\n"
+    result_text += f"**Desde:** {format_timestamp(changes['base_retrieved_at'])}\n"
+    result_text += (f"**Nuevas:** {len(changes['inserted']):,} • **Actualizadas:** {len(changes['updated']):,} • "
+                    f"**Eliminadas:** {len(changes['deleted']):,}\n")
+    for kind, label in (("inserted", "Nuevas"), ("updated", "Actualizadas"), ("deleted", "Eliminadas")):
+        keys = changes[kind]
+        if not keys:
+            continue
+        result_text += f"\n**{label}:**\n"
+        for key in keys[:limit]:
+            row = rows.get(key)
+            if isinstance(row, dict):
+                result_text += f"- `{key}`: {format_order_summary(row, fields=fields)}\n"
+            else:
+                result_text += f"- `{key}`\n"
+        if len(keys) > limit:
+            result_text += f"- … y {len(keys) - limit:,} más\n"
+    if not (changes["inserted"] or changes["updated"] or changes["deleted"]):
+        result_text += "\nSin cambios desde esa versión.\n"
+    
+    return text_response(result_text)
+
+# ============================================================
+# Exportación masiva (CSV, NDJSON o columnar binario) en streaming
+# ============================================================
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "columnar": ("application/octet-stream", "ordcol")
+}
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 1000))
+EXPORT_INLINE_MAX_ROWS = int(os.environ.get('EXPORT_INLINE_MAX_ROWS', 200))
+MAX_CONCURRENT_EXPORTS = int(os.environ.get('MAX_CONCURRENT_EXPORTS', 2))
+export_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXPORTS)
+
+# Formato columnar "ORDCOL1" (little-endian):
+#   cabecera: b"ORDCOL1\n", uint32 largo + JSON {"columns": [{"name", "type"}], ...}
+#   bloques:  b"CHNK", uint32 filas; por columna: uint8 codificación, uint32 largo
+#             del payload, máscara de nulos (1 bit por fila) y payload
+#   cierre:   b"DONE", uint32 total de filas
+# Codificaciones: 0 int64, 1 float64, 2 datetime (int64 µs desde 1970, UTC),
+# 3 date (int32 días desde 1970), 4 diccionario (uint32 n, n × [uint32 largo +
+# UTF-8], uint32 índice por fila). Decimales y texto usan el diccionario.
+COLUMNAR_MAGIC = b"ORDCOL1\n"
+COLUMNAR_INT64, COLUMNAR_FLOAT64, COLUMNAR_DATETIME, COLUMNAR_DATE, COLUMNAR_DICT = range(5)
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+def parse_export_date(value):
+    """Fecha/hora ISO de un filtro de exportación (sin zona horaria)"""
+    if not value:
+        return None
+    parsed = parse_datetime(str(value))
+    return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def prepare_export(data, args):
+    """Validar los argumentos de exportación: formato, columnas y filtros"""
+    export_format = str(args.get("format") or "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {export_format} (usa {', '.join(EXPORT_FORMATS)})")
+    
+    metadata = data.get("metadata", {})
+    columns = metadata.get("columns", [])
+    fields = parse_fields_arg(args.get("fields"))
+    if fields:
+        columns, unknown = resolve_projection(fields, columns)
+        if unknown:
+            raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+    
+    try:
+        since = parse_export_date(args.get("since"))
+        until = parse_export_date(args.get("until"))
+        if until and len(str(args.get("until")).strip()) <= 10:
+            # Fecha sin hora: incluir el día completo
+            until += timedelta(days=1, microseconds=-1)
+        limit = int(args.get("limit") or 0)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Filtro inválido: {str(e)}")
+    
+    field_map = get_field_map(data)
+    # El cuerpo se genera después de la petición (sin contexto): fijar aquí su snapshot
+    snapshot = get_snapshot()
+    filters = {
+        "query": str(args.get("query") or "").strip(),
+        "status": str(args.get("status") or "").strip().lower(),
+        "email": str(args.get("email") or "").strip().lower(),
+        "since": since,
+        "until": until,
+        "limit": max(0, limit)
+    }
+    return {
+        "format": export_format,
+        "columns": columns,
+        "schema": metadata.get("schema", {}),
+        "version": metadata.get("version"),
+        "orders": lambda: iter_export_orders(data.get("data", []), field_map, filters, snapshot)
+    }
+
+def iter_export_orders(orders, field_map, filters, snapshot):
+    """Recorrer sin copiar las órdenes del snapshot que cumplen los filtros"""
+    if filters["query"]:
+        orders = [order for order, _ in text_search(filters["query"], limit=len(orders), snapshot=snapshot)]
+    status_column = field_map["fields"].get("status")
+    date_column = field_map["fields"].get("date")
+    email_columns = field_map["email_columns"]
+    status, email = filters["status"], filters["email"]
+    since, until, limit = filters["since"], filters["until"], filters["limit"]
+    
+    count = 0
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+        if status and str(order.get(status_column) or "").lower() != status:
+            continue
+        if email and not any(email in str(order.get(column) or "").lower() for column in email_columns):
+            continue
+        if since or until:
+            moment = order.get(date_column)
+            if isinstance(moment, date) and not isinstance(moment, datetime):
+                moment = datetime.combine(moment, datetime.min.time())
+            if not isinstance(moment, datetime):
+                continue
+            moment = moment.replace(tzinfo=None)
+            if (since and moment < since) or (until and moment > until):
+                continue
+        yield order
+        count += 1
+        if limit and count >= limit:
+            return
+
+def iter_chunks(orders, size=EXPORT_CHUNK_ROWS):
+    """Agrupar un iterador de órdenes en bloques de tamaño acotado"""
+    chunk = []
+    for order in orders:
+        chunk.append(order)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_csv(orders, columns, schema):
+    """CSV con encabezado, escrito bloque a bloque"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in iter_chunks(orders):
+        for order in chunk:
+            writer.writerow(["" if order.get(column) is None else format_value(order.get(column)) for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def export_ndjson(orders, columns, schema):
+    """Un objeto JSON por línea, escrito bloque a bloque"""
+    for chunk in iter_chunks(orders):
+        lines = [json.dumps({column: order.get(column) for column in columns}, ensure_ascii=False, default=json_default)
+                 for order in chunk]
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+def datetime_micros(value):
+    """Microsegundos desde 1970 (las fechas con zona se pasan a UTC)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+def encode_columnar_column(values, col_type):
+    """Codificar una columna de un bloque: (codificación, máscara de nulos, payload)"""
+    nulls = bytearray((len(values) + 7) // 8)
+    for position, value in enumerate(values):
+        if value is None:
+            nulls[position >> 3] |= 1 << (position & 7)
+    present = [value for value in values if value is not None]
+    
+    # Un valor que no respeta el tipo declarado hace que el bloque use el diccionario
+    encoding = COLUMNAR_DICT
+    if col_type in ('integer', 'boolean') and all(isinstance(value, int) for value in present):
+        encoding, typecode, convert = COLUMNAR_INT64, 'q', int
+    elif col_type == 'float' and all(isinstance(value, (int, float)) for value in present):
+        encoding, typecode, convert = COLUMNAR_FLOAT64, 'd', float
+    elif col_type == 'datetime' and all(isinstance(value, datetime) for value in present):
+        encoding, typecode, convert = COLUMNAR_DATETIME, 'q', datetime_micros
+    elif col_type == 'date' and all(type(value) is date for value in present):
+        encoding, typecode, convert = COLUMNAR_DATE, 'i', lambda value: value.toordinal() - EPOCH_ORDINAL
+    
+    if encoding == COLUMNAR_DICT:
+        dictionary = {}
+        indexes = array.array('I', (
+            0 if value is None else dictionary.setdefault(format_value(value), len(dictionary))
+            for value in values
+        ))
+        parts = [struct.pack('<I', len(dictionary))]
+        for text in dictionary:
+            encoded = text.encode('utf-8')
+            parts.append(struct.pack('<I', len(encoded)))
+            parts.append(encoded)
+        payload_array = indexes
+    else:
+        parts = []
+        payload_array = array.array(typecode, (0 if value is None else convert(value) for value in values))
+    if sys.byteorder == 'big':
+        payload_array.byteswap()
+    parts.append(payload_array.tobytes())
+    return encoding, bytes(nulls), b"".join(parts)
+
+def export_columnar(orders, columns, schema):
+    """Formato columnar binario ORDCOL1, un bloque por cada EXPORT_CHUNK_ROWS filas"""
+    header = json.dumps({
+        "format": "ORDCOL1",
+        "columns": [{"name": column, "type": schema.get(column, "string")} for column in columns],
+        "encodings": ["int64", "float64", "datetime_us", "date_days", "dictionary"],
+        "chunk_rows": EXPORT_CHUNK_ROWS
+    }).encode('utf-8')
+    yield COLUMNAR_MAGIC + struct.pack('<I', len(header)) + header
+    
+    total = 0
+    for chunk in iter_chunks(orders):
+        parts = [b"CHNK", struct.pack('<I', len(chunk))]
+        for column in columns:
+            encoding, nulls, payload = encode_columnar_column([order.get(column) for order in chunk], schema.get(column))
+            parts.append(struct.pack('<BI', encoding, len(payload)))
+            parts.append(nulls)
+            parts.append(payload)
+        total += len(chunk)
+        yield b"".join(parts)
+    yield b"DONE" + struct.pack('<I', total)
+
+EXPORT_WRITERS = {"csv": export_csv, "ndjson": export_ndjson, "columnar": export_columnar}
+
+def export_chunks(export):
+    """Bloques de bytes de una exportación preparada con prepare_export"""
+    return EXPORT_WRITERS[export["format"]](export["orders"](), export["columns"], export["schema"])
+
+def export_query_string(args):
+    """Parámetros de /api/export equivalentes a los argumentos de la herramienta"""
+    params = {}
+    for name in ("format", "status", "email", "since", "until", "limit"):
+        if args.get(name):
+            params[name] = args[name]
+    if args.get("query"):
+        params["q"] = args["query"]
+    fields = parse_fields_arg(args.get("fields"))
+    if fields:
+        params["fields"] = ",".join(fields)
+    return urlencode(params)
+
+@mcp_tool(
+    name="export_orders",
+    description="Export the full or filtered orders snapshot (beyond the 100-row limit of list_orders) as CSV, NDJSON or compact columnar binary. Returns a streaming download URL; small CSV/NDJSON exports are also included inline.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "format": {
+                "type": "string",
+                "enum": [
+                    "csv",
+                    "ndjson",
+                    "columnar"
+                ],
+                "description": "Output format - csv, ndjson (one JSON object per line) or columnar (ORDCOL1 binary)",
+                "default": "csv"
+            },
+            "query": {
+                "type": "string",
+                "description": "Full-text filter (same as search_orders)"
+            },
+            "status": {
+                "type": "string",
+                "description": "Only orders with this status"
+            },
+            "email": {
+                "type": "string",
+                "description": "Only orders whose email contains this text"
+            },
+            "since": {
+                "type": "string",
+                "description": "Only orders dated on or after this ISO date"
+            },
+            "until": {
+                "type": "string",
+                "description": "Only orders dated on or before this ISO date"
+            },
+            "fields": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "Columns to export (default: all columns)"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum rows to export (0 = no limit)",
+                "default": 0,
+                "minimum": 0
+            }
+        },
+        "additionalProperties": False
+    }
+)
+def handle_export_orders(args, request_id):
+    """Preparar una exportación de órdenes y devolver su URL de descarga"""
+    data = get_redash_data()
+    if not data.get("success"):
+        result_text = f"❌ **Error al exportar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
+    else:
+        try:
+            export = prepare_export(data, args)
+            row_count = sum(1 for _ in export["orders"]())
+            # URL absoluta: los clientes MCP no conocen el host del servidor
+            base_url = request.url_root.rstrip('/') if has_request_context() else ""
+            url = f"{base_url}/api/export?{export_query_string(args)}".rstrip('?')
+            
+            result_text = f"📦 **Exportación de Órdenes**\n\n"
+            result_text += f"**Formato:** {export['format']}\n"
+            result_text += f"**Filas:** {row_count:,}\n"
+            result_text += f"**Columnas ({len(export['columns'])}):** {', '.join(export['columns'])}\n"
+            result_text += f"**Descarga (streaming):** `{url}`\n"
+            if export["format"] != "columnar" and row_count <= EXPORT_INLINE_MAX_ROWS:
+                content = b"".join(export_chunks(export)).decode('utf-8')
+                result_text += f"\n```{export['format']}\n{content}```\n"
+            elif export["format"] != "columnar":
+                result_text += f"\n*Más de {EXPORT_INLINE_MAX_ROWS} filas: descarga el archivo desde la URL.*\n"
+        except ValueError as e:
+            result_text = f"❌ **Error al exportar órdenes**\n\n**Error:** {str(e)}"
+    
+    return create_mcp_response({
+        "jsonrpc": "2.0",
+        "result": {
+            "content": [{
+                "type": "text",
+                "text": result_text
+            }]
+        },
+        "id": request_id
+    })
+
+GRANULARITY_LABELS = {'day': 'día', 'week': 'semana', 'month': 'mes'}
+
+def format_amount(value):
+    """Total monetario con dos decimales (o '—' si no hay)"""
+    return "—" if value is None else f"{value:,.2f}"
+
+def format_change(current, previous):
+    """Variación porcentual entre dos valores"""
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) * 100 / previous:+.1f}%"
+
+@mcp_tool(
+    name="orders_timeseries",
+    description="Order counts and totals per day, week or month (optionally by status), with rolling-window averages and period-over-period comparison. Answered from precomputed buckets.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "granularity": {
+                "type": "string",
+                "enum": [
+                    "day",
+                    "week",
+                    "month"
+                ],
+                "description": "Bucket size",
+                "default": "day"
+            },
+            "periods": {
+                "type": "integer",
+                "description": "Number of buckets to return, ending at 'end'",
+                "default": 30,
+                "minimum": 1,
+                "maximum": 366
+            },
+            "end": {
+                "type": "string",
+                "description": "Last date included (ISO, default: today)"
+            },
+            "status": {
+                "type": "string",
+                "description": "Only count orders with this status"
+            },
+            "by_status": {
+                "type": "boolean",
+                "description": "Add one count column per status",
+                "default": False
+            },
+            "rolling": {
+                "type": "integer",
+                "description": "Rolling window size in buckets for a moving average (0 = off)",
+                "default": 0,
+                "minimum": 0,
+                "maximum": 90
+            },
+            "compare": {
+                "type": "boolean",
+                "description": "Compare with the previous period of the same length",
+                "default": False
+            },
+            "format": {
+                "type": "string",
+                "enum": [
+                    "summary",
+                    "compact"
+                ],
+                "description": "Output format - summary: Markdown list, compact: tab-separated table with a header row",
+                "default": "summary"
+            }
+        },
+        "additionalProperties": False
+    }
+)
+def handle_orders_timeseries(args, request_id):
+    """Serie de tiempo de órdenes desde los contadores precalculados"""
+    data = get_redash_data()
     
-    if not order_number:
+    def text_response(text):
         return create_mcp_response({
             "jsonrpc": "2.0",
             "result": {
                 "content": [{
                     "type": "text",
-                    "text": "❌ **Número de orden requerido**\n\nPor favor proporciona un número de orden para buscar."
+                    "text": text
                 }]
             },
             "id": request_id
         })
     
-    data = get_redash_data()
     if not data.get("success"):
-        return create_mcp_response({
-            "jsonrpc": "2.0",
-            "result": {
-                "content": [{
-                    "type": "text",
-                    "text": f"❌ **Error al buscar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
-                }]
-            },
-            "id": request_id
-        })
+        return text_response(f"❌ **Error al obtener la serie de tiempo**\n\n**Error:** {data.get('error', 'Error desconocido')}")
+    series = get_snapshot().timeseries
+    if not series.get("columns", (None,))[0]:
+        return text_response("❌ **Serie de tiempo no disponible**\n\nNo se encontró una columna de fecha en los datos.")
     
-    orders = data.get("data", [])
-    matching_orders = []
+    granularity = args.get("granularity") if args.get("granularity") in TIMESERIES_GRANULARITIES else "day"
+    periods = max(1, min(int(args.get("periods") or 30), 366))
+    rolling = max(0, min(int(args.get("rolling") or 0), 90))
+    try:
+        end_day = parse_datetime(args["end"]).date() if args.get("end") else date.today()
+    except ValueError:
+        return text_response(f"❌ **Fecha inválida:** `{args.get('end')}` (usa formato ISO, p. ej. 2026-01-31)")
     
-    # Campos posibles para número de orden
-    order_number_fields = ['order_number', 'order_id', 'number', 'id', 'order', 'orderid']
+    # Estado: se compara sin distinguir mayúsculas contra los valores indexados
+    counts = series["counts"]
+    statuses = {}
+    for (bucket_granularity, _, status), count in counts.items():
+        if bucket_granularity == 'month' and status != ALL_STATUSES:
+            statuses[status] = statuses.get(status, 0) + count
+    status_filter = ALL_STATUSES
+    if args.get("status"):
+        wanted = str(args["status"]).strip().lower()
+        matches = [status for status in statuses if str(status).lower() == wanted]
+        if not matches:
+            known = ", ".join(f"`{format_value(status)}`" for status in statuses)
+            return text_response(f"❌ **Estado desconocido:** `{args['status']}`\n\n**Estados disponibles:** {known}")
+        status_filter = matches[0]
     
-    try:
-        search_term = order_number.lower()
-        for order in orders:
-            if not isinstance(order, dict):
-                continue
-                
-            found_match = False
-            for field in order_number_fields:
-                if field in order:
-                    field_value = str(order[field]).lower()
-                    
-                    if exact_match:
-                        if field_value == search_term:
-                            matching_orders.append(order)
-                            found_match = True
-                            break
-                    else:
-                        if search_term in field_value:
-                            matching_orders.append(order)
-                            found_match = True
-                            break
-            
-            if found_match and len(matching_orders) >= limit:
-                break
-        
-        match_type = "exacta" if exact_match else "parcial"
-        result_text = f"🔍 **Búsqueda por Número de Orden**\n\n"
-        result_text += f"**Término:** `{order_number}` (búsqueda {match_type})\n"
-        result_text += f"**Encontradas:** {len(matching_orders)} órdenes\n\n"
-        
-        if matching_orders:
-            for i, order in enumerate(matching_orders[:limit], 1):
-                result_text += format_order_summary(order, i) + "\n"
-                
-            if len(matching_orders) > limit:
-                result_text += f"\n*... y {len(matching_orders) - limit} órdenes más*\n"
-        else:
-            result_text += f"*No se encontraron órdenes con el número '{order_number}'.*\n"
-            result_text += f"\n**Sugerencia:** Intenta con búsqueda parcial (exact_match: false) o verifica el número de orden."
+    # Buckets hacia atrás: período pedido + ventana móvil + período anterior
+    needed = periods * (2 if args.get("compare") else 1) + max(rolling - 1, 0)
+    buckets = [bucket_start(granularity, end_day.toordinal())]
+    while len(buckets) < needed:
+        buckets.append(previous_bucket(granularity, buckets[-1]))
+    buckets.reverse()
+    values = timeseries_values(granularity, buckets, status_filter)
+    offset = len(buckets) - periods
+    current = values[offset:]
     
-    except Exception as e:
-        result_text = f"🔍 **Error en Búsqueda**\n\n**Término:** `{order_number}`\n**Error:** {str(e)}"
+    status_columns = []
+    if args.get("by_status") and status_filter == ALL_STATUSES:
+        status_columns = sorted(statuses, key=lambda status: -statuses[status])[:8]
+    by_status = {status: timeseries_values(granularity, buckets[offset:], status) for status in status_columns}
     
-    return create_mcp_response({
-        "jsonrpc": "2.0",
-        "result": {
-            "content": [{
-                "type": "text",
-                "text": result_text
-            }]
-        },
-        "id": request_id
-    })
+    rows = []
+    for position, (count, total) in enumerate(current):
+        row = {"bucket": date.fromordinal(buckets[offset + position]).isoformat(), "count": count, "total": total}
+        if rolling:
+            window = values[offset + position - rolling + 1:offset + position + 1]
+            row["rolling_avg"] = sum(window_count for window_count, _ in window) / rolling
+        if args.get("compare"):
+            row["previous"] = values[offset + position - periods][0]
+        for status in status_columns:
+            row[status] = by_status[status][position][0]
+        rows.append(row)
+    
+    period_count = sum(count for count, _ in current)
+    period_total = sum((total for _, total in current if total is not None), Decimal(0))
+    label = GRANULARITY_LABELS[granularity]
+    
+    if args.get("format") == "compact":
+        header = ["bucket", "count", "total"] + (["rolling_avg"] if rolling else []) + \
+                 (["previous"] if args.get("compare") else []) + [format_value(status) for status in status_columns]
+        lines = ["\t".join(header)]
+        for row in rows:
+            cells = [row["bucket"], str(row["count"]), compact_value(row["total"])]
+            if rolling:
+                cells.append(f"{row['rolling_avg']:.2f}")
+            if args.get("compare"):
+                cells.append(str(row["previous"]))
+            cells.extend(str(row[status]) for status in status_columns)
+            lines.append("\t".join(cells))
+        result_text = "\n".join(lines)
+    else:
+        result_text = f"📅 **Órdenes por {label}** ({rows[0]['bucket']} → {end_day.isoformat()})\n\n"
+        result_text += f"**Estado:** {'todos' if status_filter == ALL_STATUSES else format_value(status_filter)}\n"
+        result_text += f"**Total del período:** {period_count:,} órdenes • {format_amount(period_total)}\n"
+        if args.get("compare"):
+            previous = values[offset - periods:offset]
+            previous_count = sum(count for count, _ in previous)
+            previous_total = sum((total for _, total in previous if total is not None), Decimal(0))
+            result_text += (f"**Período anterior:** {previous_count:,} órdenes • {format_amount(previous_total)} "
+                            f"(**{format_change(period_count, previous_count)}** en órdenes, "
+                            f"**{format_change(period_total, previous_total)}** en total)\n")
+        result_text += "\n"
+        for row in rows:
+            line = f"- **{row['bucket']}:** {row['count']:,} órdenes • {format_amount(row['total'])}"
+            if rolling:
+                line += f" • media móvil {rolling}: {row['rolling_avg']:.1f}"
+            if args.get("compare"):
+                line += f" • anterior: {row['previous']:,}"
+            if status_columns:
+                line += " • " + ", ".join(f"{format_value(status)}: {row[status]}" for status in status_columns)
+            result_text += line + "\n"
+    
+    return text_response(result_text)
 
-def handle_search_by_email(args, request_id):
-    """Buscar órdenes por email del cliente"""
+def encode_cursor(offset):
+    """Codificar un offset de paginación como cursor opaco"""
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Decodificar un cursor de paginación; None si es inválido"""
     try:
-        email = str(args.get("email", "")).strip().lower()
-        exact_match = bool(args.get("exact_match", False))
-        limit = int(args.get("limit", 10))
-        limit = max(1, min(limit, 50))
-    except (ValueError, TypeError):
-        limit = 10
-        exact_match = False
-        email = ""
-    
-    if not email:
+        prefix, offset = base64.urlsafe_b64decode(str(cursor).encode()).decode().split(":", 1)
+        return int(offset) if prefix == "offset" and int(offset) >= 0 else None
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+@mcp_method("resources/list")
+def handle_resources_list(params, request_id):
+    """Listar órdenes como recursos MCP con paginación por cursor"""
+    cursor = params.get("cursor") if isinstance(params, dict) else None
+    offset = decode_cursor(cursor) if cursor else 0
+    if offset is None:
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {
-                "content": [{
-                    "type": "text",
-                    "text": "❌ **Email requerido**\n\nPor favor proporciona un email para buscar órdenes."
-                }]
-            },
+            "error": {"code": -32602, "message": f"Invalid cursor: {cursor}"},
             "id": request_id
         })
     
@@ -799,143 +3955,82 @@ def handle_search_by_email(args, request_id):
     if not data.get("success"):
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {
-                "content": [{
-                    "type": "text",
-                    "text": f"❌ **Error al buscar órdenes**\n\n**Error:** {data.get('error', 'Error desconocido')}"
-                }]
-            },
+            "error": {"code": -32603, "message": f"Error al obtener órdenes: {data.get('error', 'Error desconocido')}"},
             "id": request_id
         })
     
-    orders = data.get("data", [])
-    matching_orders = []
-    
-    # Campos posibles para email
-    email_fields = ['email', 'customer_email', 'user_email', 'client_email', 'mail', 'customer_mail']
-    
-    try:
-        for order in orders:
-            if not isinstance(order, dict):
-                continue
-                
-            found_match = False
-            for field in email_fields:
-                if field in order:
-                    field_value = str(order[field]).lower().strip()
-                    
-                    if exact_match:
-                        if field_value == email:
-                            matching_orders.append(order)
-                            found_match = True
-                            break
-                    else:
-                        if email in field_value:
-                            matching_orders.append(order)
-                            found_match = True
-                            break
-            
-            if found_match and len(matching_orders) >= limit:
-                break
-        
-        match_type = "exacta" if exact_match else "parcial"
-        result_text = f"📧 **Búsqueda por Email**\n\n"
-        result_text += f"**Email:** `{args.get('email')}` (búsqueda {match_type})\n"
-        result_text += f"**Encontradas:** {len(matching_orders)} órdenes\n\n"
-        
-        if matching_orders:
-            for i, order in enumerate(matching_orders[:limit], 1):
-                result_text += format_order_summary(order, i) + "\n"
-                
-            if len(matching_orders) > limit:
-                result_text += f"\n*... y {len(matching_orders) - limit} órdenes más*\n"
-        else:
-            result_text += f"*No se encontraron órdenes para el email '{args.get('email')}'.*\n"
-            result_text += f"\n**Sugerencia:** Intenta con búsqueda parcial (exact_match: false) o verifica el email."
+    keys = get_snapshot().order_keys
+    resources = []
+    if offset == 0:
+        resources.append({
+            "uri": ORDERS_COLLECTION_URI,
+            "name": "Todas las órdenes",
+            "description": f"Colección de {len(keys)} órdenes de Redash (suscribible a cambios)",
+            "mimeType": "application/json"
+        })
+    for key in keys[offset:offset + RESOURCES_PAGE_SIZE]:
+        resources.append({
+            "uri": f"orders://{key}",
+            "name": f"Orden {key}",
+            "mimeType": "application/json"
+        })
     
-    except Exception as e:
-        result_text = f"📧 **Error en Búsqueda**\n\n**Email:** `{args.get('email')}`\n**Error:** {str(e)}"
+    result = {"resources": resources}
+    if offset + RESOURCES_PAGE_SIZE < len(keys):
+        result["nextCursor"] = encode_cursor(offset + RESOURCES_PAGE_SIZE)
     
     return create_mcp_response({
         "jsonrpc": "2.0",
-        "result": {
-            "content": [{
-                "type": "text",
-                "text": result_text
-            }]
-        },
+        "result": result,
         "id": request_id
     })
 
-def handle_get_orders_stats(request_id):
-    """Obtener estadísticas de las órdenes"""
-    data = get_redash_data()
+@mcp_method("resources/read")
+def handle_resources_read(params, request_id):
+    """Leer una orden individual por URI usando el índice por clave primaria"""
+    uri = str(params.get("uri", "")) if isinstance(params, dict) else ""
+    if not uri.startswith("orders://"):
+        return create_mcp_response({
+            "jsonrpc": "2.0",
+            "error": {"code": -32602, "message": f"Invalid resource uri: {uri}"},
+            "id": request_id
+        })
     
+    data = get_redash_data()
     if not data.get("success"):
         return create_mcp_response({
             "jsonrpc": "2.0",
-            "result": {
-                "content": [{
-                    "type": "text",
-                    "text": f"❌ **Error al obtener estadísticas**\n\n**Error:** {data.get('error', 'Error desconocido')}"
-                }]
-            },
+            "error": {"code": -32603, "message": f"Error al obtener órdenes: {data.get('error', 'Error desconocido')}"},
             "id": request_id
         })
     
-    orders = data.get("data", [])
-    metadata = data.get("metadata", {})
-    
-    try:
-        result_text = f"📈 **Estadísticas de la Base de Datos de Órdenes**\n\n"
-        result_text += f"**📊 Total de Registros:** {len(orders):,}\n"
-        
-        columns = metadata.get("columns", [])
-        result_text += f"**🏷️ Total de Columnas:** {len(columns)}\n"
-        result_text += f"**🔗 Fuente de Datos:** {metadata.get('source', 'Desconocida')}\n"
-        result_text += f"**⏰ Última Actualización:** {metadata.get('retrieved_at', 'Desconocida')}\n"
-        
-        if metadata.get('data_cleaned'):
-            result_text += f"**✅ Estado de Datos:** Limpiados y validados\n"
-        
-        result_text += "\n"
-        
-        if columns:
-            result_text += "**📋 Columnas Disponibles:**\n"
-            for i, col in enumerate(columns[:20], 1):
-                safe_col = str(col) if col is not None else f"columna_{i}"
-                result_text += f"{i}. `{safe_col}`\n"
-            
-            if len(columns) > 20:
-                result_text += f"*... y {len(columns) - 20} columnas más*\n"
-        
-        if orders and isinstance(orders[0], dict):
-            result_text += f"\n**🔍 Vista Previa de Datos:**\n"
-            sample_order = orders[0]
-            sample_items = list(sample_order.items())[:5]
-            
-            for key, value in sample_items:
-                safe_key = str(key) if key is not None else "desconocido"
-                safe_value = str(value) if value is not None else "N/A"
-                value_type = type(value).__name__
-                
-                if len(safe_value) > 100:
-                    safe_value = safe_value[:97] + "..."
-                
-                result_text += f"- **{safe_key}:** `{safe_value}` *({value_type})*\n"
-            
-            if len(sample_order) > 5:
-                result_text += f"*... y {len(sample_order) - 5} campos más por registro*\n"
-    
-    except Exception as e:
-        result_text = f"📈 **Estadísticas de Órdenes**\n\n**Registros:** {len(orders)}\n**Estado:** Datos disponibles pero falló la generación de estadísticas\n**Error:** {str(e)}"
+    if uri == ORDERS_COLLECTION_URI:
+        metadata = data.get("metadata", {})
+        payload = {
+            "total_records": metadata.get("total_records"),
+            "columns": metadata.get("columns", []),
+            "schema": metadata.get("schema", {}),
+            "retrieved_at": metadata.get("retrieved_at"),
+            "source": metadata.get("source")
+        }
+    else:
+        key = uri[len("orders://"):]
+        rows = get_snapshot().order_index.get(key)
+        if not rows:
+            return create_mcp_response({
+                "jsonrpc": "2.0",
+                "error": {"code": -32002, "message": f"Resource not found: {uri}"},
+                "id": request_id
+            })
+        payload = rows[0] if len(rows) == 1 else rows
     
     return create_mcp_response({
         "jsonrpc": "2.0",
         "result": {
-            "content": [{
-                "type": "text",
-                "text": result_text
+            "contents": [{
+                "uri": uri,
+                "mimeType": "application/json",
+                "text": json.dumps(payload, ensure_ascii=False, default=json_default)
             }]
         },
         "id": request_id
@@ -953,19 +4048,28 @@ def health():
         "claude_desktop_compatible": True
     })
 
+@app.route("/ready")
+def ready():
+    """Readiness: 200 cuando el snapshot está cargado, 503 mientras se calienta"""
+    snapshot = get_snapshot()
+    warm = snapshot.result is not None
+    return create_mcp_response({
+        "ready": warm,
+        "status": "ready" if warm else "warming",
+        "records": len(snapshot.result["data"]) if warm else 0,
+        "snapshot_version": snapshot_version(snapshot.result) if warm else None,
+        "fast_start": FAST_START,
+        "uptime_seconds": round(time.time() - IMPORT_STARTED_AT, 3),
+        "startup": startup_stats
+    }, 200 if warm else 503)
+
 @app.route("/mcp-info")
 def mcp_info():
     """Información específica del servidor MCP"""
-    return create_mcp_response({
-        "server_type": "MCP Server",
-        "protocol_version": "2024-11-05",
-        "capabilities": ["tools", "resources", "prompts"],
-        "tools_available": ["list_orders", "search_orders_by_number", "search_orders_by_email", "get_orders_stats"],
-        "claude_desktop_compatible": True,
-        "status": "operational"
-    })
+    return create_raw_response(MCP_INFO_BODY)
 
 @app.route("/test-redash")
+@conditional_endpoint
 def test_redash():
     """Endpoint para probar la conexión con Redash directamente"""
     data = get_redash_data()
@@ -975,6 +4079,7 @@ def test_redash():
 def debug_endpoint():
     """Endpoint para debugging completo"""
     data = get_redash_data()
+    snapshot = get_snapshot()
     
     debug_info = {
         "connection_test": "OK" if data.get("success") else "FAILED",
@@ -983,8 +4088,35 @@ def debug_endpoint():
         "metadata": data.get("metadata", {}),
         "sample_data": data.get("data", [])[:2] if data.get("data") else [],
         "cache_info": {
-            "has_cache": data_cache is not None,
-            "cache_age_seconds": time.time() - cache_time if cache_time else None
+            "has_cache": snapshot.result is not None,
+            "cache_age_seconds": time.time() - snapshot.retrieved_at if snapshot.retrieved_at else None,
+            "preload_mode": preload_mode,
+            "history": [{"version": entry["version"], "retrieved_at": entry["retrieved_at"],
+                         "changes": len(entry["changes"])} for entry in snapshot.history],
+            "snapshot_refresher": refresher_lock_handle is not None,
+            "worker_pid": os.getpid()
+        },
+        "coalescing": {
+            "in_flight": len(inflight_calls),
+            **coalesce_stats
+        },
+        "refresh": {
+            "fetch_pages": REDASH_FETCH_PAGES,
+            "workers": REFRESH_WORKERS,
+            "parallel_min_rows": PARALLEL_MIN_ROWS,
+            **refresh_stats
+        },
+        "query_refresh": {
+            "interval_seconds": REDASH_REFRESH_INTERVAL,
+            "daily_times": [f"{hour:02d}:{minute:02d}" for hour, minute in REFRESH_SCHEDULE_TIMES],
+            **query_refresh_state
+        },
+        "admission": {
+            "max_concurrent": MAX_CONCURRENT_REQUESTS,
+            "max_queued": MAX_QUEUED_REQUESTS,
+            "rate_limit_per_second": RATE_LIMIT_PER_SECOND,
+            "rate_limit_burst": RATE_LIMIT_BURST,
+            **admission_stats
         }
     }
     
@@ -992,25 +4124,48 @@ def debug_endpoint():
 
 @app.route("/force-refresh")
 def force_refresh():
-    """Forzar actualización del cache"""
-    global data_cache, cache_time
-    data_cache = None
-    cache_time = None
-    data = get_redash_data()
+    """Forzar actualización del cache (con debounce entre refrescos)"""
+    # execute=true: re-ejecutar la query en Redash sin bloquear la petición
+    # (trigger_query_refresh aplica el mismo debounce)
+    if request.args.get('execute', 'false').lower() == 'true':
+        started, reason, retry_after = trigger_query_refresh("force-refresh")
+        if reason != "debounced":
+            return create_mcp_response({
+                "message": "Query re-execution started" if started else "Query re-execution already in progress",
+                "status": query_refresh_state["status"],
+                "status_url": "/api/refresh-status"
+            }, 202)
+    else:
+        retry_after = claim_forced_refresh()
+    
+    if retry_after:
+        data = get_snapshot().result or {}
+        return create_mcp_response({
+            "message": "Refresh skipped: data was refreshed recently",
+            "debounced": True,
+            "retry_after": retry_after,
+            "success": data.get("success"),
+            "data_count": len(data.get("data", []))
+        })
+    
+    # El snapshot anterior sigue sirviendo a otras peticiones hasta que se publique el nuevo
+    data = coalesce("redash:fetch", lambda: refresh_snapshot(fetch_redash_data))
     return create_mcp_response({
-        "message": "Cache cleared and data refreshed",
+        "message": "Cache refreshed",
         "success": data.get("success"),
         "data_count": len(data.get("data", []))
     })
 
 # Endpoints REST para probar las herramientas MCP directamente
 @app.route("/api/list-orders")
+@conditional_endpoint
+@coalesced_endpoint
 def api_list_orders():
     """REST endpoint para listar órdenes"""
     limit = request.args.get('limit', 20, type=int)
     format_type = request.args.get('format', 'summary')
     
-    args = {"limit": limit, "format": format_type}
+    args = {"limit": limit, "format": format_type, "fields": request.args.get('fields')}
     mcp_response = handle_list_orders(args, "api-test")
     
     # Extraer el contenido de la respuesta MCP
@@ -1018,6 +4173,8 @@ def api_list_orders():
     return content
 
 @app.route("/api/search-by-order/<order_number>")
+@conditional_endpoint
+@coalesced_endpoint
 def api_search_by_order(order_number):
     """REST endpoint para buscar por número de orden"""
     exact_match = request.args.get('exact', 'false').lower() == 'true'
@@ -1026,7 +4183,10 @@ def api_search_by_order(order_number):
     args = {
         "order_number": order_number,
         "exact_match": exact_match,
-        "limit": limit
+        "fuzzy": request.args.get('fuzzy', 'false').lower() == 'true',
+        "limit": limit,
+        "format": request.args.get('format', 'summary'),
+        "fields": request.args.get('fields')
     }
     mcp_response = handle_search_by_order_number(args, "api-test")
     
@@ -1034,6 +4194,8 @@ def api_search_by_order(order_number):
     return content
 
 @app.route("/api/search-by-email/<email>")
+@conditional_endpoint
+@coalesced_endpoint
 def api_search_by_email(email):
     """REST endpoint para buscar por email"""
     exact_match = request.args.get('exact', 'false').lower() == 'true'
@@ -1042,20 +4204,122 @@ def api_search_by_email(email):
     args = {
         "email": email,
         "exact_match": exact_match,
-        "limit": limit
+        "fuzzy": request.args.get('fuzzy', 'false').lower() == 'true',
+        "limit": limit,
+        "format": request.args.get('format', 'summary'),
+        "fields": request.args.get('fields')
     }
     mcp_response = handle_search_by_email(args, "api-test")
     
     content = mcp_response.get_data(as_text=True)
     return content
 
+@app.route("/api/search")
+@conditional_endpoint
+@coalesced_endpoint
+def api_search_orders():
+    """REST endpoint para búsqueda de texto completo"""
+    args = {
+        "query": request.args.get('q', ''),
+        "limit": request.args.get('limit', 10, type=int),
+        "format": request.args.get('format', 'summary'),
+        "fields": request.args.get('fields')
+    }
+    mcp_response = handle_search_orders(args, "api-test")
+    
+    content = mcp_response.get_data(as_text=True)
+    return content
+
 @app.route("/api/orders-stats")
+@conditional_endpoint
+@coalesced_endpoint
 def api_orders_stats():
     """REST endpoint para estadísticas"""
-    mcp_response = handle_get_orders_stats("api-test")
+    mcp_response = handle_get_orders_stats({}, "api-test")
+    content = mcp_response.get_data(as_text=True)
+    return content
+
+@app.route("/api/refresh-status")
+def api_refresh_status():
+    """REST endpoint para el estado de la re-ejecución de la query"""
+    args = {"trigger": request.args.get('trigger', 'false').lower() == 'true'}
+    mcp_response = handle_get_refresh_status(args, "api-test")
+    content = mcp_response.get_data(as_text=True)
+    return content
+
+def timeseries_default_end():
+    """Fecha final implícita de /api/timeseries (hoy) cuando no se pasa end"""
+    return None if request.args.get('end') else date.today().isoformat()
+
+@app.route("/api/timeseries")
+@conditional_endpoint(etag_extra=timeseries_default_end)
+@coalesced_endpoint
+def api_timeseries():
+    """REST endpoint para la serie de tiempo de órdenes"""
+    args = {
+        "granularity": request.args.get('granularity', 'day'),
+        "periods": request.args.get('periods', 30, type=int),
+        "end": request.args.get('end'),
+        "status": request.args.get('status'),
+        "by_status": request.args.get('by_status', 'false').lower() == 'true',
+        "rolling": request.args.get('rolling', 0, type=int),
+        "compare": request.args.get('compare', 'false').lower() == 'true',
+        "format": request.args.get('format', 'summary')
+    }
+    mcp_response = handle_orders_timeseries(args, "api-test")
+    content = mcp_response.get_data(as_text=True)
+    return content
+
+@app.route("/api/changes")
+@conditional_endpoint
+@coalesced_endpoint
+def api_changes():
+    """REST endpoint para los cambios de órdenes entre versiones del snapshot"""
+    args = {
+        "since_version": request.args.get('since_version'),
+        "since": request.args.get('since'),
+        "include_rows": request.args.get('include_rows', 'false').lower() == 'true',
+        "limit": request.args.get('limit', 100, type=int),
+        "format": request.args.get('format', 'summary')
+    }
+    mcp_response = handle_orders_changes(args, "api-test")
     content = mcp_response.get_data(as_text=True)
     return content
 
+@app.route("/api/export")
+def api_export():
+    """REST endpoint para exportar órdenes en streaming (CSV, NDJSON o columnar)"""
+    data = get_redash_data()
+    if not data.get("success"):
+        return create_mcp_response({"success": False, "error": data.get("error")}, 502)
+    
+    args = {name: request.args.get(name) for name in ("format", "status", "email", "since", "until", "fields", "limit")}
+    args["query"] = request.args.get('q')
+    try:
+        export = prepare_export(data, args)
+    except ValueError as e:
+        return create_mcp_response({"success": False, "error": str(e)}, 400)
+    
+    if not export_slots.acquire(blocking=False):
+        return admission_error(-32000, "Too many exports in progress, try again later", 503, 5)
+    
+    # El cuerpo se genera mientras se envía: el cupo de petición se libera al
+    # terminar la vista y el de exportación cuando el cliente termina de leer
+    body = export_chunks(export)
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        body = compress_stream(body, encoding)
+    mimetype, extension = EXPORT_FORMATS[export["format"]]
+    response = Response(body, mimetype=mimetype)
+    response.call_on_close(export_slots.release)
+    response.headers.update({name: value for name, value in MCP_RESPONSE_HEADERS.items() if name != 'Content-Type'})
+    response.headers['Content-Type'] = mimetype
+    response.headers['Content-Disposition'] = f'attachment; filename="orders-{export["version"]}.{extension}"'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route("/endpoints")
 def list_endpoints():
     """Listar todos los endpoints disponibles"""
@@ -1063,8 +4327,10 @@ def list_endpoints():
         "mcp_endpoints": {
             "root": {
                 "url": "/",
-                "methods": ["GET", "POST", "OPTIONS"],
-                "description": "Endpoint principal MCP para Claude Desktop"
+                "methods": ["GET", "POST", "DELETE", "OPTIONS"],
+                "description": ("Endpoint principal MCP para Claude Desktop (GET con Accept: text/event-stream abre el stream SSE de notificaciones)"
+                                if SUBSCRIPTIONS_ENABLED else
+                                "Endpoint principal MCP para Claude Desktop (suscripciones y SSE desactivados: varios workers)")
             }
         },
         "debug_endpoints": {
@@ -1073,6 +4339,11 @@ def list_endpoints():
                 "methods": ["GET"],
                 "description": "Health check del servidor"
             },
+            "ready": {
+                "url": "/ready",
+                "methods": ["GET"],
+                "description": "Readiness: 200 cuando el snapshot está cargado, 503 mientras se calienta"
+            },
             "mcp_info": {
                 "url": "/mcp-info",
                 "methods": ["GET"],
@@ -1091,7 +4362,7 @@ def list_endpoints():
             "force_refresh": {
                 "url": "/force-refresh",
                 "methods": ["GET"],
-                "description": "Limpiar cache y refrescar datos"
+                "description": "Refrescar datos (máximo uno cada FORCE_REFRESH_MIN_INTERVAL segundos); execute=true re-ejecuta la query en Redash en segundo plano"
             },
             "endpoints": {
                 "url": "/endpoints",
@@ -1106,7 +4377,8 @@ def list_endpoints():
                 "description": "Listar órdenes",
                 "parameters": {
                     "limit": "Número máximo de órdenes (default: 20)",
-                    "format": "Formato: summary, detailed, json (default: summary)"
+                    "format": "Formato: summary, detailed, json, compact (default: summary)",
+                    "fields": "Columnas separadas por coma para compact/json (opcional)"
                 }
             },
             "search_by_order": {
@@ -1115,7 +4387,10 @@ def list_endpoints():
                 "description": "Buscar órdenes por número",
                 "parameters": {
                     "exact": "Búsqueda exacta: true/false (default: false)",
-                    "limit": "Número máximo de resultados (default: 10)"
+                    "fuzzy": "Búsqueda difusa tolerante a errores: true/false (default: false)",
+                    "limit": "Número máximo de resultados (default: 10)",
+                    "format": "Formato: summary, compact (default: summary)",
+                    "fields": "Columnas separadas por coma para compact (opcional)"
                 }
             },
             "search_by_email": {
@@ -1124,28 +4399,93 @@ def list_endpoints():
                 "description": "Buscar órdenes por email",
                 "parameters": {
                     "exact": "Búsqueda exacta: true/false (default: false)",
-                    "limit": "Número máximo de resultados (default: 10)"
+                    "fuzzy": "Búsqueda difusa tolerante a errores: true/false (default: false)",
+                    "limit": "Número máximo de resultados (default: 10)",
+                    "format": "Formato: summary, compact (default: summary)",
+                    "fields": "Columnas separadas por coma para compact (opcional)"
+                }
+            },
+            "search": {
+                "url": "/api/search",
+                "methods": ["GET"],
+                "description": "Búsqueda de texto completo en todas las columnas",
+                "parameters": {
+                    "q": "Texto a buscar (sin distinguir tildes)",
+                    "limit": "Número máximo de resultados (default: 10)",
+                    "format": "Formato: summary, compact (default: summary)",
+                    "fields": "Columnas separadas por coma para compact (opcional)"
                 }
             },
             "orders_stats": {
                 "url": "/api/orders-stats",
                 "methods": ["GET"],
                 "description": "Estadísticas de órdenes"
+            },
+            "timeseries": {
+                "url": "/api/timeseries",
+                "methods": ["GET"],
+                "description": "Órdenes por día, semana o mes (desde contadores precalculados)",
+                "parameters": {
+                    "granularity": "day, week, month (default: day)",
+                    "periods": "Número de buckets (default: 30)",
+                    "end": "Última fecha incluida, ISO (default: hoy)",
+                    "status": "Solo órdenes con este estado (opcional)",
+                    "by_status": "Una columna por estado: true/false (default: false)",
+                    "rolling": "Ventana de media móvil en buckets (default: 0)",
+                    "compare": "Comparar con el período anterior: true/false (default: false)",
+                    "format": "Formato: summary, compact (default: summary)"
+                }
+            },
+            "changes": {
+                "url": "/api/changes",
+                "methods": ["GET"],
+                "description": "Órdenes nuevas, actualizadas y eliminadas desde una versión del snapshot",
+                "parameters": {
+                    "since_version": "Versión que ya tiene el cliente (default: el refresh anterior)",
+                    "since": "Fecha ISO; se usa si no hay since_version (opcional)",
+                    "include_rows": "Incluir las filas actuales: true/false (default: false)",
+                    "limit": "Máximo de claves por tipo de cambio (default: 100)",
+                    "format": "Formato: summary, json (default: summary)"
+                }
+            },
+            "export": {
+                "url": "/api/export",
+                "methods": ["GET"],
+                "description": "Exportar todas las órdenes (o filtradas) en streaming",
+                "parameters": {
+                    "format": "Formato: csv, ndjson, columnar (default: csv)",
+                    "q": "Filtro de texto completo (opcional)",
+                    "status": "Solo órdenes con este estado (opcional)",
+                    "email": "Solo órdenes cuyo email contiene este texto (opcional)",
+                    "since": "Desde esta fecha ISO (opcional)",
+                    "until": "Hasta esta fecha ISO (opcional)",
+                    "fields": "Columnas separadas por coma (default: todas)",
+                    "limit": "Máximo de filas, 0 = sin límite (default: 0)"
+                }
+            },
+            "refresh_status": {
+                "url": "/api/refresh-status",
+                "methods": ["GET"],
+                "description": "Estado de la re-ejecución de la query en Redash",
+                "parameters": {
+                    "trigger": "Iniciar una re-ejecución en segundo plano: true/false (default: false)"
+                }
             }
         },
-        "mcp_tools": [
-            "list_orders",
-            "search_orders_by_number", 
-            "search_orders_by_email",
-            "get_orders_stats"
-        ]
+        "mcp_tools": list(MCP_TOOLS)
     }
     
     return create_mcp_response(endpoints)
 
+build_static_responses()
+startup_stats["import_seconds"] = round(time.time() - IMPORT_STARTED_AT, 3)
+
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     print(f"🚀 Starting MCP Server (Claude Desktop Compatible) on port {port}")
     print("📡 Enhanced MCP protocol support enabled")
-    print("🔧 Available tools: list_orders, search_orders_by_number, search_orders_by_email, get_orders_stats")
+    print(f"🔧 Available tools: {', '.join(MCP_TOOLS)}")
+    ensure_query_refresher_running()
+    if FAST_START:
+        start_warmup()
     app.run(host='0.0.0.0', port=port, debug=False)
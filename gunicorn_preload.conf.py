@@ -0,0 +1,43 @@
+# ⚙️ Configuración de gunicorn en modo preload
+# Uso: gunicorn -c gunicorn_preload.conf.py app:app
+#
+# El proceso maestro descarga los datos de Redash y construye los índices antes
+# de crear los workers, así que estos atienden desde el primer momento sin
+# consultar Redash. Después, un solo worker (el que tiene el lock de refresco)
+# consulta Redash y publica cada snapshot nuevo en SNAPSHOT_DIR; el resto lo
+# carga desde ahí.
+#
+# Este modo coordina las descargas (una por refresh para todos los workers), no
+# comparte memoria: cada worker carga su propia copia de cada snapshot y el
+# maestro conserva la inicial, así que la memoria es de ~N+1 datasets. Solo el
+# snapshot inicial se comparte por copy-on-write, y únicamente hasta el primer
+# refresh. Para acotar la memoria, bajar WEB_CONCURRENCY y subir GUNICORN_THREADS.
+#
+# Con FAST_START=1 el maestro solo precarga los módulos: los workers aceptan
+# peticiones de inmediato (/health) y cargan el snapshot en segundo plano;
+# /ready devuelve 200 cuando está listo.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = True
+
+# Las sesiones MCP (suscripciones y streams SSE) viven en la memoria de un worker,
+# así que solo funcionan con uno: ENABLE_SUBSCRIPTIONS=true fuerza workers=1
+# (escalar con GUNICORN_THREADS); si no, con varios workers se desactivan y
+# initialize deja de anunciar "subscribe".
+if os.environ.get('ENABLE_SUBSCRIPTIONS', '').lower() in ('1', 'true', 'yes'):
+    workers = 1
+elif workers > 1:
+    os.environ['ENABLE_SUBSCRIPTIONS'] = 'false'
+
+def on_starting(server):
+    import app
+    app.preload_snapshot()
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
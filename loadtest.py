@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# 📈 Generador de carga para el servidor MCP
+#
+# Simula sesiones MCP realistas (initialize, notifications/initialized,
+# tools/list y una mezcla de tools/call) con N sesiones concurrentes, contra:
+#   - http:  POST directo al endpoint JSON-RPC (una conexión keep-alive por sesión)
+#   - stdio: el proxy de macConfig.sh (un proceso bash + curl por mensaje), que es
+#            el camino que usa Claude Desktop
+# Por defecto levanta un Redash falso y el servidor local (gunicorn si está
+# instalado, si no `python app.py`) y mide también el tiempo hasta /health y /ready.
+#
+# Uso:
+#   python loadtest.py                          # ambos modos, 8 sesiones × 20 llamadas
+#   python loadtest.py --mode http --sessions 32 --calls 50 --rows 20000
+#   python loadtest.py --url http://localhost:5000/ --mode stdio
+#   python loadtest.py --json resultados.json
+#
+# El servidor se lanza con RATE_LIMIT_PER_SECOND/RATE_LIMIT_BURST altos (todas las
+# sesiones salen de la misma IP); exporta esas variables para medir con los límites reales.
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATUSES = ["pending", "paid", "shipped", "delivered", "cancelled"]
+CITIES = ["Bogotá", "Medellín", "Cali", "Barranquilla", "Cartagena"]
+
+# ============================================================
+# Redash falso
+# ============================================================
+
+def fake_orders_payload(rows, seed):
+    """Respuesta de results.json con órdenes sintéticas"""
+    rng = random.Random(seed)
+    columns = [
+        {"name": "order_number", "type": "string"},
+        {"name": "email", "type": "string"},
+        {"name": "customer_name", "type": "string"},
+        {"name": "status", "type": "string"},
+        {"name": "total", "type": "float"},
+        {"name": "created_at", "type": "datetime"},
+        {"name": "city", "type": "string"},
+        {"name": "items", "type": "integer"}
+    ]
+    data = []
+    for i in range(rows):
+        data.append({
+            "order_number": f"ORD-{100000 + i}",
+            "email": f"cliente{i % max(rows // 3, 1)}@example.com",
+            "customer_name": f"Cliente {i}",
+            "status": rng.choice(STATUSES),
+            "total": round(rng.uniform(10, 900), 2),
+            "created_at": f"2026-{1 + i % 9:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00",
+            "city": rng.choice(CITIES),
+            "items": 1 + i % 6
+        })
+    return {"query_result": {"id": 1, "retrieved_at": "2026-10-01T00:00:00Z",
+                             "data": {"columns": columns, "rows": data}}}
+
+def start_fake_redash(rows, seed, latency):
+    """Servidor HTTP que imita la API de Redash (results.json, ejecución y jobs)"""
+    body = json.dumps(fake_orders_payload(rows, seed)).encode()
+    job = json.dumps({"job": {"id": "loadtest", "status": 3, "query_result_id": 1}}).encode()
+
+    class FakeRedashHandler(BaseHTTPRequestHandler):
+        def reply(self, payload):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path.startswith("/api/jobs/"):
+                self.reply(job)
+            elif path.endswith("/results.json") or path.startswith("/api/query_results/"):
+                self.reply(body)
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.reply(job)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRedashHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ============================================================
+# Servidor MCP local
+# ============================================================
+
+def free_port():
+    """Puerto TCP libre en localhost"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def http_get(base_url, path, timeout=5):
+    """GET simple: (status, cuerpo) o (None, None) si no hay conexión"""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    except OSError:
+        return None, None
+    finally:
+        connection.close()
+
+def start_server(server, port, redash_url, workdir):
+    """Lanzar el servidor con el Redash falso; devuelve el proceso"""
+    env = dict(os.environ, PORT=str(port), REDASH_BASE_URL=redash_url)
+    env.setdefault("RATE_LIMIT_PER_SECOND", "100000")
+    env.setdefault("RATE_LIMIT_BURST", "100000")
+    env.setdefault("PYTHONUNBUFFERED", "1")
+    env.setdefault("SNAPSHOT_DIR", os.path.join(workdir, "snapshot"))
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn_preload.conf.py", "app:app"]
+    else:
+        command = [sys.executable, "app.py"]
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for_startup(base_url, process, timeout):
+    """Segundos hasta que /health y /ready responden 200.
+    Sin preload ni FAST_START los datos se cargan con la primera petición: se hace una."""
+    started = time.time()
+    startup = {"health_seconds": None, "ready_seconds": None, "lazy_load": False}
+    while time.time() - started < timeout:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar (código {process.returncode})")
+        if startup["health_seconds"] is None and http_get(base_url, "/health", 1)[0] == 200:
+            startup["health_seconds"] = round(time.time() - started, 3)
+        if startup["health_seconds"] is not None:
+            status, body = http_get(base_url, "/ready", 30)
+            if status == 200:
+                startup["ready_seconds"] = round(time.time() - started, 3)
+                startup["server"] = json.loads(body).get("startup")
+                return startup
+            if not startup["lazy_load"]:
+                startup["lazy_load"] = True
+                http_get(base_url, "/test-redash", timeout)
+                continue
+        time.sleep(0.05)
+    raise TimeoutError(f"El servidor no quedó listo en {timeout:.0f}s")
+
+def stop_server(process):
+    """Terminar el servidor (gunicorn cierra sus workers con SIGTERM)"""
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# ============================================================
+# Sesiones MCP
+# ============================================================
+
+def tool_mix(rows):
+    """Llamadas a herramientas con pesos aproximados al uso real"""
+    customers = max(rows // 3, 1)
+    return [
+        (30, lambda rng: ("search_orders_by_number", {"order_number": f"ORD-{100000 + rng.randrange(rows)}", "exact_match": True})),
+        (15, lambda rng: ("search_orders_by_email", {"email": f"cliente{rng.randrange(customers)}@example.com"})),
+        (15, lambda rng: ("search_orders", {"query": rng.choice(CITIES) + " " + rng.choice(STATUSES), "limit": 10})),
+        (10, lambda rng: ("list_orders", {"limit": 20, "format": rng.choice(["summary", "compact"])})),
+        (10, lambda rng: ("get_orders_stats", {})),
+        (8, lambda rng: ("orders_timeseries", {"granularity": rng.choice(["day", "week", "month"]), "periods": 12, "end": "2026-09-30"})),
+        (5, lambda rng: ("search_orders_by_number", {"order_number": f"ORD-{100000 + rng.randrange(rows)}9", "fuzzy": True})),
+        (4, lambda rng: ("orders_changes", {"format": "json"})),
+        (3, lambda rng: ("export_orders", {"format": "csv", "status": rng.choice(STATUSES), "limit": 50}))
+    ]
+
+def session_messages(rng, calls, mix):
+    """Mensajes JSON-RPC de una sesión: (método, mensaje)"""
+    yield "initialize", {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {
+        "protocolVersion": "2024-11-05", "capabilities": {},
+        "clientInfo": {"name": "loadtest", "version": "1.0"}}}
+    yield "notifications/initialized", {"jsonrpc": "2.0", "method": "notifications/initialized"}
+    yield "tools/list", {"jsonrpc": "2.0", "id": 1, "method": "tools/list", "params": {}}
+    weights = [weight for weight, _ in mix]
+    for call in range(calls):
+        name, arguments = rng.choices([build for _, build in mix], weights)[0](rng)
+        yield f"tools/call:{name}", {"jsonrpc": "2.0", "id": call + 2, "method": "tools/call",
+                                     "params": {"name": name, "arguments": arguments}}
+
+def response_ok(method, status, body):
+    """Una respuesta cuenta como error si es un error HTTP, un error JSON-RPC o un resultado con isError.
+    Las notificaciones solo son correctas con 202 o un 2xx sin cuerpo."""
+    if status >= 400:
+        return False
+    if method.startswith("notifications/"):
+        return status == 202 or not body.strip()
+    try:
+        reply = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(reply, dict) and "error" not in reply and not reply.get("result", {}).get("isError")
+
+def run_http_session(base_url, messages, record):
+    """Una sesión por HTTP directo, reutilizando la conexión como un cliente MCP"""
+    parts = urlsplit(base_url)
+    path = parts.path or "/"
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    headers = {"Content-Type": "application/json", "Accept": "application/json",
+               "Accept-Encoding": "gzip", "User-Agent": "MCP-LoadTest/1.0"}
+    try:
+        for method, message in messages:
+            started = time.perf_counter()
+            try:
+                connection.request("POST", path, json.dumps(message), headers)
+                response = connection.getresponse()
+                body = response.read()
+                if response.getheader("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                ok = response_ok(method, response.status, body)
+                if method == "initialize" and response.getheader("Mcp-Session-Id"):
+                    headers["Mcp-Session-Id"] = response.getheader("Mcp-Session-Id")
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            record(method, time.perf_counter() - started, ok)
+    finally:
+        connection.close()
+
+def extract_proxy_script(destination):
+    """Extraer el proxy genérico del heredoc de macConfig.sh"""
+    with open(os.path.join(ROOT, "macConfig.sh"), encoding="utf-8") as config:
+        match = re.search(r"<< 'PROXY_EOF'\n(.*?)\nPROXY_EOF\n", config.read(), re.S)
+    if not match:
+        raise RuntimeError("No se encontró el proxy genérico (PROXY_EOF) en macConfig.sh")
+    with open(destination, "w", encoding="utf-8") as script:
+        script.write(match.group(1) + "\n")
+    os.chmod(destination, 0o755)
+    return destination
+
+def run_stdio_session(base_url, messages, record, proxy):
+    """Una sesión a través del proxy stdio: una línea JSON por mensaje y por respuesta.
+    Las notificaciones no producen salida; cualquier línea que no corresponda al id
+    esperado es un error del proxy para la notificación pendiente (sin latencia)."""
+    process = subprocess.Popen(["bash", proxy, base_url], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, encoding="utf-8", bufsize=1)
+    pending = []
+
+    def settle_notifications(extra_lines):
+        # Las primeras notificaciones pendientes se llevan los errores sobrantes
+        for index, method in enumerate(pending):
+            record(method, None, index >= extra_lines)
+        for _ in range(max(0, extra_lines - len(pending))):
+            record("notifications/(desconocida)", None, False)
+        pending.clear()
+
+    try:
+        for method, message in messages:
+            started = time.perf_counter()
+            process.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+            process.stdin.flush()
+            if "id" not in message:
+                pending.append(method)
+                continue
+            extra_lines = 0
+            while True:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    reply = json.loads(line)
+                except ValueError:
+                    reply = None
+                if isinstance(reply, dict) and reply.get("id") == message["id"]:
+                    break
+                extra_lines += 1
+            settle_notifications(extra_lines)
+            record(method, time.perf_counter() - started, bool(line) and response_ok(method, 200, line))
+    finally:
+        process.stdin.close()
+        if pending:
+            settle_notifications(sum(1 for line in process.stdout if line.strip()))
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def run_mode(mode, base_url, args, proxy=None):
+    """Ejecutar todas las sesiones de un modo en paralelo y devolver sus muestras"""
+    samples = []
+    samples_lock = threading.Lock()
+
+    def record(method, seconds, ok):
+        with samples_lock:
+            samples.append((method, seconds, ok))
+
+    mix = tool_mix(args.rows)
+
+    def session(number):
+        messages = session_messages(random.Random(args.seed * 1000 + number), args.calls, mix)
+        if mode == "http":
+            run_http_session(base_url, messages, record)
+        else:
+            run_stdio_session(base_url, messages, record, proxy)
+
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(args.sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+# ============================================================
+# Reporte
+# ============================================================
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * fraction // 1))
+    return sorted_values[int(rank) - 1]
+
+def summarize(samples, elapsed):
+    """Latencias p50/p95/p99 (ms), RPS y tasa de error, en total y por método"""
+    def stats(group):
+        # Las notificaciones por stdio no tienen latencia medible (None): cuentan solo en errores
+        latencies = sorted(seconds * 1000 for _, seconds, _ in group if seconds is not None)
+        errors = sum(1 for _, _, ok in group if not ok)
+        return {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 4) if group else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None
+        }
+
+    by_method = {}
+    for sample in samples:
+        by_method.setdefault(sample[0], []).append(sample)
+    total = stats(samples)
+    total["elapsed_seconds"] = round(elapsed, 3)
+    total["rps"] = round(len(samples) / elapsed, 1) if elapsed else None
+    return {"total": total, "methods": {method: stats(group) for method, group in sorted(by_method.items())}}
+
+def print_summary(title, summary):
+    """Tabla legible del resumen de un modo"""
+    total = summary["total"]
+    print(f"\n📊 {title}: {total['requests']} mensajes en {total['elapsed_seconds']}s • "
+          f"{total['rps']} RPS • errores {total['error_rate'] * 100:.2f}%")
+    print(f"   {'método':<42}{'n':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for method, stats in list(summary["methods"].items()) + [("TOTAL", total)]:
+        quantiles = "".join(f"{stats[name]:>10.2f}" if stats[name] is not None else f"{'-':>10}"
+                            for name in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"   {method:<42}{stats['requests']:>7}{stats['errors']:>6}{quantiles}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor MCP (HTTP directo y proxy stdio)")
+    parser.add_argument("--mode", choices=["http", "stdio", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=8, help="Sesiones concurrentes (default: 8)")
+    parser.add_argument("--calls", type=int, default=20, help="tools/call por sesión (default: 20)")
+    parser.add_argument("--rows", type=int, default=5000, help="Filas del Redash falso (default: 5000)")
+    parser.add_argument("--redash-latency", type=float, default=0.0, help="Latencia simulada de Redash en segundos")
+    parser.add_argument("--url", help="Usar un servidor ya levantado (no se inicia Redash falso ni servidor)")
+    parser.add_argument("--server", choices=["gunicorn", "flask"],
+                        default="gunicorn" if shutil.which("gunicorn") else "flask")
+    parser.add_argument("--port", type=int, default=0, help="Puerto del servidor local (default: uno libre)")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mcp-loadtest-")
+    process = redash = None
+    results = {"config": {name: value for name, value in vars(args).items() if name != "json"}}
+    try:
+        if args.url:
+            base_url = args.url
+            results["startup"] = wait_for_startup(base_url, None, args.startup_timeout)
+        else:
+            redash = start_fake_redash(args.rows, args.seed, args.redash_latency)
+            redash_url = f"http://127.0.0.1:{redash.server_address[1]}"
+            base_url = f"http://127.0.0.1:{args.port or free_port()}/"
+            print(f"🧪 Redash falso en {redash_url} ({args.rows:,} filas) • servidor {args.server} en {base_url}")
+            process = start_server(args.server, urlsplit(base_url).port, redash_url, workdir)
+            results["startup"] = wait_for_startup(base_url, process, args.startup_timeout)
+            print(f"📝 Log del servidor: {os.path.join(workdir, 'server.log')}")
+        startup = results["startup"]
+        print(f"🚀 /health en {startup['health_seconds']}s • /ready en {startup['ready_seconds']}s")
+
+        modes = ["http", "stdio"] if args.mode == "both" else [args.mode]
+        proxy = extract_proxy_script(os.path.join(workdir, "generic-mcp-proxy.sh")) if "stdio" in modes else None
+        titles = {"http": "HTTP directo", "stdio": "Proxy stdio (macConfig.sh)"}
+        for mode in modes:
+            print(f"⏱️ {titles[mode]}: {args.sessions} sesiones × ({args.calls} tools/call + 3 mensajes de inicio)")
+            samples, elapsed = run_mode(mode, base_url, args, proxy)
+            results[mode] = summarize(samples, elapsed)
+            print_summary(titles[mode], results[mode])
+
+        if "http" in results and "stdio" in results:
+            # Corridas distintas: es la diferencia entre percentiles, no el overhead de cada mensaje
+            difference = {quantile: round(results["stdio"]["total"][quantile] - results["http"]["total"][quantile], 2)
+                          for quantile in ("p50_ms", "p95_ms", "p99_ms")}
+            results["percentile_difference_ms"] = difference
+            print(f"\n🔌 Diferencia de percentiles stdio − http (corridas distintas, no overhead por mensaje): "
+                  f"p50 {difference['p50_ms']} ms • p95 {difference['p95_ms']} ms • p99 {difference['p99_ms']} ms")
+    finally:
+        if process is not None:
+            stop_server(process)
+        if redash is not None:
+            redash.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {args.json}")
+    errors = sum(results[mode]["total"]["errors"] for mode in ("http", "stdio") if mode in results)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -151,14 +151,19 @@ while IFS= read -r line; do
     if [ -n "$line" ]; then
         log_error "📥 Request recibido de Claude Desktop"
         
-        response=$(curl -s --max-time 30 -X POST "$REMOTE_SERVER" \
+        # --compressed: pedir gzip/brotli (Accept-Encoding) y descomprimir la respuesta
+        response=$(curl -s --compressed --max-time 30 -X POST "$REMOTE_SERVER" \
             -H "Content-Type: application/json" \
             -H "User-Agent: Claude-MCP-Proxy/1.0" \
             -d "$line" 2>/dev/null)
         
-        if [ $? -eq 0 ] && [ -n "$response" ]; then
+        status=$?
+        if [ $status -eq 0 ] && [ -n "$response" ]; then
             log_error "📤 Response enviado a Claude Desktop"
             echo "$response"
+        elif [ $status -eq 0 ]; then
+            # Notificación (202 sin cuerpo): no hay respuesta que reenviar
+            log_error "📤 Notificación entregada"
         else
             log_error "❌ Error de comunicación con servidor remoto"
             # Respuesta de error estándar JSON-RPC
@@ -203,14 +208,18 @@ while IFS= read -r line; do
     if [ -n "\$line" ]; then
         log_error "📥 Request de Claude Desktop"
         
-        response=\$(curl -s --max-time 30 -X POST "\$REMOTE_SERVER" \\
+        response=\$(curl -s --compressed --max-time 30 -X POST "\$REMOTE_SERVER" \\
             -H "Content-Type: application/json" \\
             -H "User-Agent: Claude-MCP-Proxy-$server_name/1.0" \\
             -d "\$line" 2>/dev/null)
         
-        if [ \$? -eq 0 ] && [ -n "\$response" ]; then
+        status=\$?
+        if [ \$status -eq 0 ] && [ -n "\$response" ]; then
             log_error "📤 Response del servidor $server_name"
             echo "\$response"
+        elif [ \$status -eq 0 ]; then
+            # Notificación (202 sin cuerpo): no hay respuesta que reenviar
+            log_error "📤 Notificación entregada a $server_name"
         else
             log_error "❌ Error comunicación con $server_name"
             echo '{"jsonrpc":"2.0","error":{"code":-32603,"message":"$server_name communication error"},"id":null}'